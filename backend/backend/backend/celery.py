@@ -29,6 +29,18 @@ app.conf.update(
 # Cargar módulos de tareas desde todas las apps registradas
 app.autodiscover_tasks()
 
+# Tareas periódicas (ejecutar con: celery -A backend beat)
+app.conf.beat_schedule = {
+    'relay-email-outbox': {
+        'task': 'emailer.tasks.relay_email_outbox',
+        'schedule': float(os.getenv('EMAIL_OUTBOX_RELAY_INTERVAL', '5')),
+    },
+    'purge-email-verifications': {
+        'task': 'emailer.tasks.purge_email_verifications',
+        'schedule': float(os.getenv('EMAIL_VERIFICATION_PURGE_INTERVAL', '3600')),
+    },
+}
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
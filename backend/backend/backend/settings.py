@@ -91,6 +91,17 @@ DATABASES = {
 }
 
 
+# Cache (memoria local del proceso)
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sorteo-default',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -159,6 +170,47 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False').lower() == 'true'
 CELERY_TASK_EAGER_PROPAGATES = True
 
+# Colas dedicadas: una avalancha de verificaciones no retrasa la notificación al ganador.
+# Worker: celery -A backend worker -Q notifications,verification,celery
+EMAIL_VERIFICATION_QUEUE = os.getenv('EMAIL_VERIFICATION_QUEUE', 'verification')
+EMAIL_NOTIFICATIONS_QUEUE = os.getenv('EMAIL_NOTIFICATIONS_QUEUE', 'notifications')
+# Prioridad de mensaje (Redis: 0 es la más alta, 9 la más baja)
+CELERY_TASK_ROUTES = {
+    'emailer.tasks.send_winner_notification_email': {'queue': EMAIL_NOTIFICATIONS_QUEUE, 'priority': 0},
+    'emailer.tasks.send_winner_notification': {'queue': EMAIL_NOTIFICATIONS_QUEUE, 'priority': 0},
+    'emailer.tasks.send_verification_email': {'queue': EMAIL_VERIFICATION_QUEUE, 'priority': 6},
+    'emailer.tasks.relay_email_outbox': {'queue': EMAIL_VERIFICATION_QUEUE, 'priority': 3},
+}
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    # Las colas se consumen en el orden de -Q (notifications primero)
+    'queue_order_strategy': 'priority',
+    # Timeouts cortos: si Redis cae, publicar falla rápido en vez de colgar la request.
+    # socket_timeout debe superar la espera de BRPOP del worker (1 s)
+    'socket_connect_timeout': float(os.getenv('CELERY_BROKER_CONNECT_TIMEOUT', '1')),
+    'socket_timeout': float(os.getenv('CELERY_BROKER_SOCKET_TIMEOUT', '3')),
+    # Sin reintentos de conexión de kombu al publicar (publish_task): con el puerto
+    # cerrado cada intento fallido costaba ~2 s. El worker usa sus propios reintentos
+    # (broker_connection_max_retries) y .delay() su retry_policy
+    'max_retries': 0,
+}
+CELERY_BROKER_CONNECTION_TIMEOUT = float(os.getenv('CELERY_BROKER_CONNECT_TIMEOUT', '1'))
+# Circuito de publicación: tras N fallos seguidos no se intenta publicar durante RESET segundos
+# y los emails quedan en el outbox
+BROKER_BREAKER_FAILURE_THRESHOLD = int(os.getenv('BROKER_BREAKER_FAILURE_THRESHOLD', '3'))
+BROKER_BREAKER_RESET_SECONDS = float(os.getenv('BROKER_BREAKER_RESET_SECONDS', '30'))
+# acks_late: si el worker muere a mitad de envío el mensaje vuelve a la cola
+CELERY_TASK_ACKS_LATE = os.getenv('CELERY_TASK_ACKS_LATE', 'True').lower() == 'true'
+CELERY_TASK_REJECT_ON_WORKER_LOST = CELERY_TASK_ACKS_LATE
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv('CELERY_WORKER_PREFETCH_MULTIPLIER', '1'))
+# Los emails no guardan resultado (ignore_result); el resto caduca pronto en Redis
+CELERY_RESULT_EXPIRES = int(os.getenv('CELERY_RESULT_EXPIRES', '600'))  # segundos
+
+# Reintentos de las tareas de email (backoff exponencial con jitter); al agotarlos van a EmailDeadLetter
+EMAIL_TASK_MAX_RETRIES = int(os.getenv('EMAIL_TASK_MAX_RETRIES', '5'))
+EMAIL_TASK_RETRY_BACKOFF_MAX = int(os.getenv('EMAIL_TASK_RETRY_BACKOFF_MAX', '600'))  # segundos
+
 # Email Configuration
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
@@ -167,6 +219,40 @@ EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@sorteo-san-valentin.com')
+# Conexiones SMTP simultáneas de emailer.backends.AsyncSMTPEmailBackend
+EMAIL_ASYNC_CONCURRENCY = int(os.getenv('EMAIL_ASYNC_CONCURRENCY', '8'))
+
+# Bandeja de salida transaccional de emails (relay: Celery beat o manage.py relay_email_outbox)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', '100'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '5'))
+# Segundos que un relay retiene los mensajes reclamados; si muere, otro los retoma
+EMAIL_OUTBOX_CLAIM_SECONDS = int(os.getenv('EMAIL_OUTBOX_CLAIM_SECONDS', '300'))
+# 'batch': el relay envía por SMTP con una conexión por lote; 'publish': una tarea Celery por mensaje
+EMAIL_OUTBOX_DELIVERY = os.getenv('EMAIL_OUTBOX_DELIVERY', 'batch')
+EMAIL_SEND_BATCH_SIZE = int(os.getenv('EMAIL_SEND_BATCH_SIZE', '50'))  # mensajes por conexión SMTP
+
+# Enlaces de verificación firmados (django.core.signing): se validan sin consultar la base
+EMAIL_VERIFICATION_SIGNED_LINKS = os.getenv('EMAIL_VERIFICATION_SIGNED_LINKS', 'False').lower() == 'true'
+
+# Concurso activo cacheado para el registro; fuera de start_date/end_date no se aceptan registros
+ACTIVE_CONTEST_CACHE_SECONDS = int(os.getenv('ACTIVE_CONTEST_CACHE_SECONDS', '60'))
+# Opcional: el concurso por defecto (DEFAULT_CONTEST) y el de db.sqlite3 ya terminaron
+CONTEST_ENFORCE_REGISTRATION_WINDOW = os.getenv('CONTEST_ENFORCE_REGISTRATION_WINDOW', 'False').lower() == 'true'
+
+# Emails registrados hace poco (en memoria del proceso): rechaza ráfagas de duplicados sin consultar la base. 0 = desactivado
+REGISTRATION_RECENT_EMAILS_SECONDS = int(os.getenv('REGISTRATION_RECENT_EMAILS_SECONDS', '300'))
+
+# Caché de las respuestas de verify-token (nunca más allá de expires_at del token)
+VERIFY_TOKEN_CACHE_SECONDS = int(os.getenv('VERIFY_TOKEN_CACHE_SECONDS', '300'))
+
+# Hilos para calcular hashes de contraseña fuera de la transacción (emailer.hashing)
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+
+# Limpieza periódica de tokens de verificación usados o expirados (Celery beat)
+EMAIL_VERIFICATION_PURGE_BATCH_SIZE = int(os.getenv('EMAIL_VERIFICATION_PURGE_BATCH_SIZE', '1000'))
+
+# Versión de las plantillas de email (cambiarla invalida la caché de renderizado)
+EMAIL_TEMPLATE_VERSION = os.getenv('EMAIL_TEMPLATE_VERSION', '1')
 
 # CORS settings (para el frontend)
 CORS_ALLOWED_ORIGINS = os.getenv(
@@ -213,4 +299,22 @@ CSRF_EXEMPT_URLS = [
 # JWT Configuration
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', SECRET_KEY)
 JWT_ACCESS_TOKEN_LIFETIME = int(os.getenv('JWT_ACCESS_TOKEN_LIFETIME', '20'))  # minutos
-JWT_REFRESH_TOKEN_LIFETIME = int(os.getenv('JWT_REFRESH_TOKEN_LIFETIME', '7'))  # días
\ No newline at end of file
+JWT_REFRESH_TOKEN_LIFETIME = int(os.getenv('JWT_REFRESH_TOKEN_LIFETIME', '7'))  # días
+
+# Paginación de participantes (panel de administración)
+ADMIN_PARTICIPANTS_PAGE_SIZE = int(os.getenv('ADMIN_PARTICIPANTS_PAGE_SIZE', '100'))
+ADMIN_PARTICIPANTS_MAX_PAGE_SIZE = int(os.getenv('ADMIN_PARTICIPANTS_MAX_PAGE_SIZE', '1000'))
+
+# Tamaño de lote al exportar participantes en streaming
+ADMIN_EXPORT_CHUNK_SIZE = int(os.getenv('ADMIN_EXPORT_CHUNK_SIZE', '2000'))
+
+# Segundos que se cachea el usuario del token JWT (0 desactiva la caché)
+JWT_USER_CACHE_SECONDS = int(os.getenv('JWT_USER_CACHE_SECONDS', '60'))
+
+# Lista negra de JWT: 'redis' (compartida entre workers) o 'memory' (local al proceso)
+JWT_BLACKLIST_BACKEND = os.getenv('JWT_BLACKLIST_BACKEND', 'redis')
+JWT_BLACKLIST_REDIS_URL = os.getenv('JWT_BLACKLIST_REDIS_URL', os.getenv('REDIS_URL', CELERY_BROKER_URL))
+JWT_BLACKLIST_LOCAL_CACHE_SECONDS = float(os.getenv('JWT_BLACKLIST_LOCAL_CACHE_SECONDS', '5'))  # caché negativa local
+# True acepta los tokens si Redis no responde (un logout hecho en otro worker deja de
+# aplicarse); por defecto la request se rechaza con 503
+JWT_BLACKLIST_FAIL_OPEN = os.getenv('JWT_BLACKLIST_FAIL_OPEN', 'False').lower() == 'true'
@@ -0,0 +1,151 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import BasePermission
+from .jwt_utils import BlacklistUnavailable, JWTService, TokenBlacklistService
+
+
+class JWTAuthError(Exception):
+    """Error de autenticación JWT con mensaje, código y status HTTP"""
+
+    def __init__(self, message, code, status_code=status.HTTP_401_UNAUTHORIZED):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.status_code = status_code
+
+    def as_dict(self):
+        return {
+            'success': False,
+            'message': self.message,
+            'code': self.code
+        }
+
+
+class JWTAuthenticationFailed(APIException):
+    """Respuesta DRF con el mismo formato de error que el resto de la API"""
+    status_code = status.HTTP_401_UNAUTHORIZED
+
+    def __init__(self, error):
+        super().__init__(detail=error.as_dict(), code=error.code)
+        self.status_code = error.status_code
+
+
+def get_bearer_token(request):
+    """Extrae el token del header Authorization (formato: Bearer <token>)"""
+    auth_header = request.META.get('HTTP_AUTHORIZATION')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    return auth_header.split(' ', 1)[1].strip() or None
+
+
+def authenticate_jwt_request(request):
+    """
+    Decodifica el token, revisa la lista negra y carga el usuario una sola vez
+    por request. El resultado (o el error) queda memorizado en el HttpRequest,
+    así el middleware, las clases DRF y los decoradores lo comparten.
+    Devuelve (user, payload) o lanza JWTAuthError.
+    """
+    cached = getattr(request, '_jwt_auth_result', None)
+    if cached is None:
+        cached = _authenticate(request)
+        request._jwt_auth_result = cached
+
+    if isinstance(cached, JWTAuthError):
+        raise cached
+    return cached
+
+
+def _authenticate(request):
+    token = get_bearer_token(request)
+    if not token:
+        return JWTAuthError('Token de autorización requerido. Formato: Bearer <token>', 'TOKEN_REQUIRED')
+
+    payload, error = JWTService.decode_token(token)
+    if error or not payload:
+        return JWTAuthError(f'Token inválido: {error or "Token no válido"}', 'INVALID_TOKEN')
+
+    try:
+        if TokenBlacklistService.is_jti_blacklisted(payload.get('jti')):
+            return JWTAuthError('Token invalidado', 'TOKEN_REVOKED')
+    except BlacklistUnavailable:
+        return JWTAuthError(
+            'No se pudo verificar la sesión. Intenta de nuevo en unos momentos',
+            'AUTH_UNAVAILABLE',
+            status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    user = get_cached_user(payload.get('user_id'))
+    if user is None:
+        return JWTAuthError('Usuario no encontrado', 'USER_NOT_FOUND')
+
+    if not user.is_active:
+        return JWTAuthError('Usuario inactivo', 'USER_INACTIVE')
+
+    return user, payload
+
+
+def user_cache_key(user_id):
+    return f"jwt:user:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    Carga el usuario del token desde la caché de Django (TTL configurable en
+    JWT_USER_CACHE_SECONDS). Las señales post_save/post_delete de CustomUser
+    invalidan la entrada, así que los cambios se ven en la siguiente request.
+    """
+    if user_id is None:
+        return None
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is not None:
+        return user
+
+    from .models import CustomUser
+    try:
+        user = CustomUser.objects.get(id=user_id)
+    except (CustomUser.DoesNotExist, ValueError, TypeError):
+        return None
+
+    if settings.JWT_USER_CACHE_SECONDS > 0:
+        cache.set(key, user, settings.JWT_USER_CACHE_SECONDS)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def is_admin_user(user):
+    """Un administrador es un usuario activo con permisos de staff"""
+    return bool(user and user.is_authenticated and user.is_active and user.is_staff)
+
+
+class JWTAdminAuthentication(BaseAuthentication):
+    """Autenticación DRF basada en JWTService (request.auth es el payload)"""
+
+    def authenticate(self, request):
+        try:
+            user, payload = authenticate_jwt_request(request._request)
+        except JWTAuthError as e:
+            raise JWTAuthenticationFailed(e)
+        return user, payload
+
+    def authenticate_header(self, request):
+        return 'Bearer'
+
+
+class IsAdminJWTUser(BasePermission):
+    """Permite el acceso solo a administradores autenticados por JWT"""
+    message = {
+        'success': False,
+        'message': 'Usuario no encontrado o sin permisos de administrador',
+        'code': 'ACCESS_DENIED'
+    }
+
+    def has_permission(self, request, view):
+        return is_admin_user(request.user)
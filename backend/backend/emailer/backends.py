@@ -0,0 +1,120 @@
+import logging
+import smtplib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSMTPEmailBackend(BaseEmailBackend):
+    """
+    Backend de email que envía con varias conexiones SMTP a la vez.
+    Los mensajes de un lote se reparten entre EMAIL_ASYNC_CONCURRENCY
+    conexiones, cada una atendida por un hilo, así el worker no queda
+    esperando la red mensaje a mensaje. El pool de hilos y las conexiones se
+    crean en open() y se reutilizan hasta close() (o `with`), igual que el
+    backend SMTP de Django. Un envío de un solo mensaje (email.send() en una
+    tarea de Celery) va directo por el hilo que llama, sin pool.
+
+    Uso: EMAIL_BACKEND=emailer.backends.AsyncSMTPEmailBackend
+    """
+    
+    def __init__(self, fail_silently=False, concurrency=None, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.concurrency = max(1, concurrency or settings.EMAIL_ASYNC_CONCURRENCY)
+        self.smtp_options = kwargs  # host, port, username, password, use_tls...
+        self._pool = []  # Conexiones SMTP (backend de Django con una conexión cada uno)
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def open(self):
+        if self._executor is not None:
+            return False
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='smtp')
+        return True
+    
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._close_pool()
+    
+    def send_messages(self, email_messages):
+        results = self.send_messages_detailed(email_messages)
+        errors = [error for error in results if error is not None]
+        if errors and not self.fail_silently:
+            raise errors[0]
+        return len(results) - len(errors)
+    
+    def send_messages_detailed(self, email_messages):
+        """Envía los mensajes y devuelve una lista paralela con None o la excepción"""
+        email_messages = list(email_messages)
+        if not email_messages:
+            return []
+        with self._lock:
+            workers = min(self.concurrency, len(email_messages))
+            while len(self._pool) < workers:
+                self._pool.append(SMTPEmailBackend(fail_silently=False, **self.smtp_options))
+            
+            results = [None] * len(email_messages)
+            pending = deque(enumerate(email_messages))
+            if workers == 1:
+                # Sin concurrencia posible: se envía en este hilo sin crear el pool
+                try:
+                    _drain(self._pool[0], pending, results)
+                finally:
+                    if self._executor is None:
+                        self._close_pool()
+                return results
+            
+            new_executor = self.open()
+            try:
+                futures = [self._executor.submit(_drain, connection, pending, results) for connection in self._pool[:workers]]
+                for future in futures:
+                    future.result()
+            finally:
+                if new_executor:
+                    self.close()
+            return results
+    
+    def _close_pool(self):
+        for connection in self._pool:
+            _close_quietly(connection)
+        self._pool = []
+
+
+def _drain(connection, pending, results):
+    """Cada conexión toma mensajes de la cola común (deque.popleft es seguro entre hilos)"""
+    while True:
+        try:
+            index, message = pending.popleft()
+        except IndexError:
+            return
+        try:
+            _send_one(connection, message)
+        except Exception as e:
+            logger.warning(f"Error enviando email a {message.to}: {e}")
+            results[index] = e
+
+
+def _send_one(connection, message):
+    """Se ejecuta en el hilo de la conexión; reconecta si la anterior falló"""
+    try:
+        connection.open()  # Sin efecto si ya está abierta
+        if not connection.send_messages([message]):
+            raise smtplib.SMTPException('El servidor no aceptó el mensaje')
+    except Exception:
+        # La sesión pudo quedar inválida: la siguiente llamada abre otra
+        _close_quietly(connection)
+        raise
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        connection.connection = None
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+class BrokerUnavailable(Exception):
+    """El broker no respondió o el circuito está abierto"""
+
+
+class CircuitBreaker:
+    """
+    Circuito por proceso para publicar en el broker. Tras `failure_threshold`
+    fallos seguidos se abre y las publicaciones fallan al instante durante
+    `reset_seconds`; después deja pasar una sola publicación de prueba
+    (semiabierto) que lo cierra si sale bien o lo vuelve a abrir si falla.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+    
+    def is_open(self):
+        """True mientras el circuito está abierto y no toca probar (sin efectos)"""
+        with self._lock:
+            return self._rejects()
+    
+    def before_call(self):
+        """Lanza BrokerUnavailable si no se debe intentar publicar"""
+        with self._lock:
+            if self._rejects():
+                raise BrokerUnavailable('Circuito del broker abierto')
+            if self.state == self.OPEN:
+                self.state = self.HALF_OPEN  # Esta llamada es la prueba
+    
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuito del broker abierto por {self.reset_seconds}s tras {self.failures} fallos")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+    
+    def _rejects(self):
+        if self.state == self.HALF_OPEN:
+            return True  # Ya hay una prueba en curso
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_seconds
+
+
+_breaker = None
+
+def get_broker_breaker():
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(settings.BROKER_BREAKER_FAILURE_THRESHOLD, settings.BROKER_BREAKER_RESET_SECONDS)
+    return _breaker
+
+@receiver(setting_changed)
+def _reset_broker_breaker(setting, **kwargs):
+    global _breaker
+    if setting.startswith('BROKER_BREAKER_'):
+        _breaker = None
+
+
+def publish_task(task, *args, **kwargs):
+    """
+    Publica la tarea sin los reintentos de Celery ni los de conexión de kombu
+    (max_retries=0 y timeouts cortos en CELERY_BROKER_TRANSPORT_OPTIONS).
+    Lanza BrokerUnavailable al instante si el circuito está abierto.
+    """
+    breaker = get_broker_breaker()
+    breaker.before_call()
+    try:
+        result = task.apply_async(args, kwargs, retry=False)
+    except Exception as e:
+        breaker.record_failure()
+        raise BrokerUnavailable(str(e)) from e
+    breaker.record_success()
+    return result
+
+
+def publish_or_spool(task, kind, *args):
+    """
+    Publica la tarea de email o, si el broker no está disponible, la deja en
+    el outbox (EmailOutbox) para que el relay la envíe después.
+    Devuelve True si se publicó y False si quedó en el outbox.
+    """
+    try:
+        publish_task(task, *args)
+        return True
+    except BrokerUnavailable as e:
+        from .outbox import enqueue_email
+        logger.warning(f"Broker no disponible ({e}); {task.name} queda en el outbox")
+        enqueue_email(kind, *args)
+        return False
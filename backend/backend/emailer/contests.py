@@ -0,0 +1,46 @@
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import Contest
+
+ACTIVE_CONTEST_CACHE_KEY = 'contest:active'
+
+# Concurso que se crea si no hay ninguno activo (mismo comportamiento que antes)
+DEFAULT_CONTEST = {
+    'name': 'Sorteo San Valentín 2025',
+    'description': 'Gana una estadía romántica de 2 noches para una pareja',
+    'start_date': datetime(2025, 1, 1, tzinfo=dt_timezone.utc),
+    'end_date': datetime(2025, 2, 14, 23, 59, 59, tzinfo=dt_timezone.utc)
+}
+
+
+def get_active_contest():
+    """
+    Devuelve el concurso activo desde la caché de Django; solo consulta la base
+    (get_or_create) cuando la entrada no existe. Las señales de Contest la
+    invalidan; ACTIVE_CONTEST_CACHE_SECONDS acota lo que otro proceso puede
+    tardar en ver un cambio si la caché no es compartida.
+    """
+    contest = cache.get(ACTIVE_CONTEST_CACHE_KEY)
+    if contest is None:
+        # La restricción unique_active_contest evita duplicados si dos requests llegan a la vez
+        contest, _ = Contest.objects.get_or_create(is_active=True, defaults=DEFAULT_CONTEST)
+        cache.set(ACTIVE_CONTEST_CACHE_KEY, contest, settings.ACTIVE_CONTEST_CACHE_SECONDS)
+    return contest
+
+
+def invalidate_active_contest():
+    cache.delete(ACTIVE_CONTEST_CACHE_KEY)
+
+
+def registration_window_error(contest, now=None):
+    """Mensaje de error si el concurso no acepta registros en este momento, o None"""
+    if not settings.CONTEST_ENFORCE_REGISTRATION_WINDOW:
+        return None
+    now = now or timezone.now()
+    if now < contest.start_date:
+        return 'El concurso aún no ha comenzado.'
+    if now > contest.end_date:
+        return 'El concurso ya finalizó. No se aceptan nuevos registros.'
+    return None
@@ -2,8 +2,7 @@ from functools import wraps
 from django.http import JsonResponse
 from rest_framework import status
 from rest_framework.response import Response
-from .models import CustomUser
-from .jwt_utils import JWTService
+from .authentication import JWTAuthError, authenticate_jwt_request, is_admin_user
 
 def jwt_required(view_func):
     """
@@ -12,47 +11,24 @@ def jwt_required(view_func):
     """
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        # Obtener el header de autorización
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        # Decodificar el token y cargar el usuario (resultado compartido por request)
+        try:
+            user, payload = authenticate_jwt_request(getattr(request, '_request', request))
+        except JWTAuthError as e:
+            return Response(e.as_dict(), status=e.status_code)
         
-        if not auth_header or not auth_header.startswith('Bearer '):
+        # Verificar que el usuario es staff
+        if not is_admin_user(user):
             return Response({
                 'success': False,
-                'message': 'Token de autorización requerido. Formato: Bearer <token>'
+                'message': 'Usuario no encontrado o sin permisos de administrador'
             }, status=status.HTTP_401_UNAUTHORIZED)
         
-        # Extraer el token
-        token = auth_header.split(' ')[1]
+        # Agregar el usuario al request
+        request.user = user
         
-        try:
-            # Decodificar el token
-            payload = JWTService.decode_token(token)
-            
-            # Verificar que el usuario existe y es staff
-            try:
-                user = CustomUser.objects.get(
-                    id=payload['user_id'], 
-                    is_staff=True,
-                    is_active=True
-                )
-                
-                # Agregar el usuario al request
-                request.user = user
-                
-                # Llamar a la vista original
-                return view_func(request, *args, **kwargs)
-                
-            except CustomUser.DoesNotExist:
-                return Response({
-                    'success': False,
-                    'message': 'Usuario no encontrado o sin permisos de administrador'
-                }, status=status.HTTP_401_UNAUTHORIZED)
-                
-        except Exception as e:
-            return Response({
-                'success': False,
-                'message': f'Token inválido o expirado: {str(e)}'
-            }, status=status.HTTP_401_UNAUTHORIZED)
+        # Llamar a la vista original
+        return view_func(request, *args, **kwargs)
     
     return wrapper
 
@@ -0,0 +1,87 @@
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+# Marcador para los campos por destinatario; sobrevive al autoescape de Django
+FIELD_PLACEHOLDER = '__EMAIL_FIELD_{}__'
+_PLACEHOLDER_RE = re.compile(r'__EMAIL_FIELD_(\w+?)__')
+
+_STYLE_BLOCK_RE = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+_CSS_RULE_RE = re.compile(r'([^{}@]+)\{([^{}]*)\}')
+_TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)(\s[^<>]*?)?(/?)>')
+_ATTR_RE = r'\s{}\s*=\s*"([^"]*)"'
+
+
+def inline_css(html):
+    """
+    Copia las reglas CSS simples (`tag` o `.clase`) del bloque <style> al
+    atributo style de cada elemento, para clientes de correo que ignoran
+    <style>. Los estilos inline existentes se mantienen al final (ganan).
+    Las reglas @keyframes/@media quedan solo en el bloque <style>.
+    """
+    css = ''.join(_STYLE_BLOCK_RE.findall(html))
+    css = re.sub(r'@[^{]+\{(?:[^{}]*\{[^{}]*\})*[^{}]*\}', '', css)  # quitar bloques @
+
+    rules = []
+    for selectors, declarations in _CSS_RULE_RE.findall(css):
+        declarations = ' '.join(d.strip() + ';' for d in declarations.split(';') if d.strip())
+        for selector in selectors.split(','):
+            selector = selector.strip()
+            if re.fullmatch(r'\.?[a-zA-Z][\w-]*', selector):
+                rules.append((selector, declarations))
+    if not rules:
+        return html
+
+    def apply_rules(match):
+        tag, attrs, closing = match.group(1), match.group(2) or '', match.group(3)
+        if tag.lower() in ('html', 'head', 'style', 'meta', 'title'):
+            return match.group(0)
+        class_match = re.search(_ATTR_RE.format('class'), attrs)
+        classes = class_match.group(1).split() if class_match else []
+        declarations = [
+            decl for selector, decl in rules
+            if selector == tag.lower() or (selector.startswith('.') and selector[1:] in classes)
+        ]
+        if not declarations:
+            return match.group(0)
+
+        style_match = re.search(_ATTR_RE.format('style'), attrs)
+        if style_match:
+            style = ' '.join(declarations) + ' ' + style_match.group(1)
+            attrs = attrs[:style_match.start()] + attrs[style_match.end():]
+        else:
+            style = ' '.join(declarations)
+        return f'<{tag}{attrs} style="{style}"{closing}>'
+
+    head_end = html.lower().find('</head>')
+    head, body = (html[:head_end], html[head_end:]) if head_end != -1 else ('', html)
+    return head + _TAG_RE.sub(apply_rules, body)
+
+
+@lru_cache(maxsize=32)
+def _compiled_email(template_base, fields, version):
+    """
+    Renderiza la plantilla una sola vez con marcadores en lugar de los campos
+    por destinatario (y con el CSS ya inline). La clave incluye la versión de
+    las plantillas, así un cambio de EMAIL_TEMPLATE_VERSION invalida la caché.
+    """
+    context = {field: FIELD_PLACEHOLDER.format(field) for field in fields}
+    text = render_to_string(f'emailer/emails/{template_base}.txt', context).strip()
+    html = inline_css(render_to_string(f'emailer/emails/{template_base}.html', context))
+    return text, html
+
+
+def render_email(template_base, **fields):
+    """
+    Devuelve (texto, html) de una plantilla de email. Solo se sustituyen los
+    campos por destinatario sobre el resultado precompilado y cacheado.
+    """
+    text, html = _compiled_email(template_base, tuple(sorted(fields)), settings.EMAIL_TEMPLATE_VERSION)
+    values = {name: str(value) for name, value in fields.items()}
+    escaped = {name: escape(value) for name, value in values.items()}
+    return (
+        _PLACEHOLDER_RE.sub(lambda m: values[m.group(1)], text),
+        _PLACEHOLDER_RE.sub(lambda m: escaped[m.group(1)], html),
+    )
@@ -0,0 +1,36 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_hash_executor():
+    """
+    Pool acotado (PASSWORD_HASH_WORKERS hilos) para calcular hashes de
+    contraseña. PBKDF2 (hashlib) libera el GIL, así que los hilos calculan en
+    paralelo sin bloquear el resto del proceso; el límite evita que una
+    avalancha de activaciones acapare todos los núcleos.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    thread_name_prefix='password-hash'
+                )
+    return _executor
+
+
+def hash_password(raw_password):
+    """Calcula el hash en el pool y espera el resultado (vistas síncronas)"""
+    return get_hash_executor().submit(make_password, raw_password).result()
+
+
+async def ahash_password(raw_password):
+    """Versión async: el event loop sigue atendiendo otras requests mientras tanto"""
+    return await asyncio.wrap_future(get_hash_executor().submit(make_password, raw_password))
@@ -1,10 +1,19 @@
 import jwt
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils import timezone
 import uuid
 
+logger = logging.getLogger(__name__)
+
 User = get_user_model()
 
 class JWTService:
@@ -91,8 +100,135 @@ class JWTService:
         exp_datetime = datetime.fromtimestamp(exp_timestamp, tz=timezone.utc)
         return timezone.now() > exp_datetime
 
-# Lista en memoria para tokens invalidados (en producción usar Redis o DB)
-BLACKLISTED_TOKENS = set()
+class BlacklistUnavailable(Exception):
+    """La lista negra compartida no respondió y no se puede confirmar que el token siga vigente"""
+
+
+class InMemoryBlacklistStore:
+    """Lista negra local al proceso (tests/desarrollo sin Redis)"""
+    prune_every = 100  # Cada cuántas altas se barren las entradas expiradas
+    
+    def __init__(self):
+        self._entries = {}  # jti -> instante de expiración (time.monotonic)
+        self._lock = threading.Lock()
+        self._adds_since_prune = 0
+    
+    def add(self, jti, ttl_seconds):
+        with self._lock:
+            now = time.monotonic()
+            self._entries[jti] = now + ttl_seconds
+            # Un jti que no se vuelve a consultar no pasa por contains(): se barre aquí
+            self._adds_since_prune += 1
+            if self._adds_since_prune >= self.prune_every:
+                self._adds_since_prune = 0
+                for expired in [key for key, expires_at in self._entries.items() if expires_at <= now]:
+                    del self._entries[expired]
+    
+    def contains(self, jti):
+        with self._lock:
+            expires_at = self._entries.get(jti)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._entries[jti]
+                return False
+            return True
+    
+    def remaining_seconds(self, jti):
+        """Segundos hasta que expira la entrada, o None si no está"""
+        with self._lock:
+            expires_at = self._entries.get(jti)
+        if expires_at is None:
+            return None
+        remaining = expires_at - time.monotonic()
+        return remaining if remaining > 0 else None
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisBlacklistStore:
+    """Lista negra compartida en Redis: cada jti expira junto con su token"""
+    key_prefix = 'jwt:blacklist:'
+    
+    def __init__(self, url, timeout=0.5):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+    
+    def add(self, jti, ttl_seconds):
+        self.client.set(f"{self.key_prefix}{jti}", 1, ex=max(int(math.ceil(ttl_seconds)), 1))
+    
+    def contains(self, jti):
+        return bool(self.client.exists(f"{self.key_prefix}{jti}"))
+
+class NegativeLookupCache:
+    """
+    Caché local de jti confirmados como NO invalidados, para no consultar Redis
+    en cada request. Un logout en otro worker tarda como máximo `ttl` segundos
+    en verse aquí; un logout en este proceso se aplica de inmediato.
+    """
+    
+    def __init__(self, ttl_seconds, max_entries=1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def hit(self, jti):
+        if self.ttl_seconds <= 0:
+            return False
+        with self._lock:
+            expires_at = self._entries.get(jti)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._entries[jti]
+                return False
+            return True
+    
+    def remember(self, jti):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[jti] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(jti)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def discard(self, jti):
+        with self._lock:
+            self._entries.pop(jti, None)
+
+# Respaldo local si Redis no está disponible (mismo comportamiento que antes)
+_local_blacklist = InMemoryBlacklistStore()
+# jti invalidados durante una caída de Redis, pendientes de copiar allí
+_unsynced_jtis = set()
+_unsynced_lock = threading.Lock()
+_blacklist_store = None
+_negative_cache = None
+
+def get_blacklist_store():
+    """Devuelve el almacén configurado en JWT_BLACKLIST_BACKEND (redis | memory)"""
+    global _blacklist_store
+    if _blacklist_store is None:
+        if settings.JWT_BLACKLIST_BACKEND == 'redis':
+            _blacklist_store = RedisBlacklistStore(settings.JWT_BLACKLIST_REDIS_URL)
+        else:
+            _blacklist_store = _local_blacklist
+    return _blacklist_store
+
+def get_negative_cache():
+    global _negative_cache
+    if _negative_cache is None:
+        _negative_cache = NegativeLookupCache(settings.JWT_BLACKLIST_LOCAL_CACHE_SECONDS)
+    return _negative_cache
+
+@receiver(setting_changed)
+def _reset_blacklist_store(setting, **kwargs):
+    global _blacklist_store, _negative_cache
+    if setting.startswith('JWT_BLACKLIST_'):
+        _blacklist_store = None
+        _negative_cache = None
 
 class TokenBlacklistService:
     """Servicio para manejar tokens invalidados"""
@@ -102,12 +238,47 @@ class TokenBlacklistService:
         """Agrega un token a la lista negra"""
         payload, error = JWTService.decode_token(token)
         if not error and payload:
-            jti = payload.get('jti')
-            if jti:
-                BLACKLISTED_TOKENS.add(jti)
-                return True
+            return TokenBlacklistService.blacklist_payload(payload)
         return False
     
+    @staticmethod
+    def blacklist_payload(payload):
+        """
+        Agrega a la lista negra un token ya decodificado. La entrada vive
+        solo hasta el `exp` del token: después el token ya no es válido.
+        """
+        jti = payload.get('jti')
+        if not jti:
+            return False
+        
+        get_negative_cache().discard(jti)
+        ttl_seconds = payload.get('exp', 0) - timezone.now().timestamp()
+        if ttl_seconds <= 0:
+            return True  # Ya expirado, no hace falta guardarlo
+        
+        try:
+            get_blacklist_store().add(jti, ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Lista negra compartida no disponible, usando memoria local: {e}")
+            _local_blacklist.add(jti, ttl_seconds)
+            with _unsynced_lock:
+                _unsynced_jtis.add(jti)
+        return True
+    
+    @staticmethod
+    def sync_local_blacklist(store):
+        """Copia al almacén compartido los jti invalidados mientras no respondía"""
+        if store is _local_blacklist or not _unsynced_jtis:
+            return
+        with _unsynced_lock:
+            pending = list(_unsynced_jtis)
+        for jti in pending:
+            ttl_seconds = _local_blacklist.remaining_seconds(jti)
+            if ttl_seconds is not None:
+                store.add(jti, ttl_seconds)
+            with _unsynced_lock:
+                _unsynced_jtis.discard(jti)
+    
     @staticmethod
     def is_token_blacklisted(token):
         """Verifica si un token está en la lista negra"""
@@ -115,5 +286,35 @@ class TokenBlacklistService:
         if error or not payload:
             return True
         
-        jti = payload.get('jti')
-        return jti in BLACKLISTED_TOKENS if jti else True
\ No newline at end of file
+        return TokenBlacklistService.is_jti_blacklisted(payload.get('jti'))
+    
+    @staticmethod
+    def is_jti_blacklisted(jti):
+        """Verifica por jti (sin decodificar de nuevo el token)"""
+        if not jti:
+            return True
+        
+        # Un logout hecho durante una caída de Redis solo consta en memoria local
+        store = get_blacklist_store()
+        if store is not _local_blacklist and _local_blacklist.contains(jti):
+            return True
+        
+        negative_cache = get_negative_cache()
+        if negative_cache.hit(jti):
+            return False
+        
+        try:
+            TokenBlacklistService.sync_local_blacklist(store)
+            blacklisted = store.contains(jti)
+        except Exception as e:
+            # Un token revocado en otro worker solo consta en Redis: por defecto
+            # se rechaza la request en vez de aceptarlo (JWT_BLACKLIST_FAIL_OPEN)
+            if settings.JWT_BLACKLIST_FAIL_OPEN:
+                logger.warning(f"Lista negra compartida no disponible, se acepta el token: {e}")
+                return False
+            logger.error(f"Lista negra compartida no disponible, se rechaza el token: {e}")
+            raise BlacklistUnavailable(str(e)) from e
+        
+        if not blacklisted:
+            negative_cache.remember(jti)
+        return blacklisted
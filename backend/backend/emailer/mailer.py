@@ -0,0 +1,56 @@
+import logging
+import smtplib
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+def send_messages_bulk(messages, batch_size=None):
+    """
+    Envía los mensajes reutilizando una conexión SMTP por cada lote de
+    `batch_size` mensajes (un solo handshake TLS + login por lote).
+    Cada mensaje se envía por separado sobre la conexión abierta para saber
+    cuál falló sin reenviar los demás.
+    Devuelve una lista paralela a `messages` con None (enviado) o la excepción.
+    """
+    batch_size = batch_size or settings.EMAIL_SEND_BATCH_SIZE
+    results = []
+
+    for start in range(0, len(messages), batch_size):
+        batch = messages[start:start + batch_size]
+        connection = get_connection(fail_silently=False)
+        if hasattr(connection, 'send_messages_detailed'):
+            # Backend concurrente (AsyncSMTPEmailBackend): envía el lote completo a la vez
+            with connection:
+                results.extend(connection.send_messages_detailed(batch))
+            continue
+
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"No se pudo abrir la conexión de email: {e}")
+            results.extend(e for _ in batch)
+            continue
+
+        try:
+            for message in batch:
+                message.connection = connection
+                try:
+                    sent = connection.send_messages([message])
+                    results.append(None if sent else smtplib.SMTPException('El servidor no aceptó el mensaje'))
+                except Exception as e:
+                    results.append(e)
+                    # El servidor pudo cerrar la sesión: reconectar para el resto del lote
+                    try:
+                        connection.close()
+                        connection.open()
+                    except Exception as reopen_error:
+                        logger.error(f"No se pudo reabrir la conexión de email: {reopen_error}")
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    return results
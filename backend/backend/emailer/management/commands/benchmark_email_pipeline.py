@@ -0,0 +1,126 @@
+import json
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from emailer.models import CustomUser
+from emailer.smtp_sink import SMTPSink
+from emailer.tasks import build_verification_email, send_verification_email, verification_payload
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(percent / 100 * len(values))) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark del envío de emails de verificación contra un servidor SMTP local: '
+        'mensajes/s, latencia p50/p99 de extremo a extremo y costo de renderizado'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200, help='Emails por modo')
+        parser.add_argument('--mode', choices=['eager', 'worker', 'all'], default='all')
+        parser.add_argument('--sink-latency-ms', type=float, default=0, help='Demora del servidor SMTP por respuesta')
+        parser.add_argument(
+            '--broker',
+            default='memory://',
+            help='Broker para el modo worker (por defecto en memoria; p. ej. redis://localhost:6379/15)'
+        )
+        parser.add_argument('--timeout', type=float, default=120, help='Segundos máximos de espera por modo')
+        parser.add_argument('--json', action='store_true', help='Salida en JSON (para comparar entre versiones)')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        payloads = [
+            verification_payload(CustomUser(email=f'bench-{i}@bench.local', first_name=f'Bench {i}'), f'token-{i}')
+            for i in range(count)
+        ]
+        modes = ['eager', 'worker'] if options['mode'] == 'all' else [options['mode']]
+
+        results = {'count': count, 'render_us': self.measure_render(payloads)}
+        for mode in modes:
+            with SMTPSink(latency=options['sink_latency_ms'] / 1000) as sink:
+                with override_settings(
+                    EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                    EMAIL_HOST=sink.host, EMAIL_PORT=sink.port,
+                    EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+                    EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD=''
+                ):
+                    run = self.run_eager if mode == 'eager' else self.run_worker
+                    sent_at = run(payloads, sink, options)
+                results[mode] = self.summarize(payloads, sent_at, sink)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"Renderizado: {results['render_us']:.1f} µs/email")
+        for mode in modes:
+            r = results[mode]
+            self.stdout.write(
+                f"{mode:<7} {r['sent']:>6}/{count} enviados  {r['messages_per_second']:8.1f} msg/s  "
+                f"p50 {r['p50_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms"
+            )
+
+    def measure_render(self, payloads):
+        build_verification_email(payloads[0])  # Calentar la caché de plantillas
+        start = time.perf_counter()
+        for payload in payloads:
+            build_verification_email(payload)
+        return (time.perf_counter() - start) / len(payloads) * 1_000_000
+
+    def run_eager(self, payloads, sink, options):
+        """La tarea se ejecuta en este proceso (como con CELERY_TASK_ALWAYS_EAGER)"""
+        sent_at = []
+        for payload in payloads:
+            sent_at.append(time.perf_counter())
+            send_verification_email.apply(args=[payload], throw=True)
+        return sent_at
+
+    def run_worker(self, payloads, sink, options):
+        """Publica en el broker y consume con un worker solo dentro de este proceso"""
+        from celery.contrib.testing.worker import start_worker
+        from backend.celery import app
+
+        # Celery lee CELERY_BROKER_URL del entorno antes que de la configuración
+        previous_broker = os.environ.get('CELERY_BROKER_URL')
+        os.environ['CELERY_BROKER_URL'] = options['broker']
+        transport_options = {'polling_interval': 0.01} if options['broker'].startswith('memory://') else {}
+        try:
+            with override_settings(CELERY_BROKER_URL=options['broker'], CELERY_BROKER_TRANSPORT_OPTIONS=transport_options):
+                with start_worker(
+                    app, pool='solo', concurrency=1, perform_ping_check=False, loglevel='WARNING',
+                    queues=[route['queue'] for route in app.conf.task_routes.values()] + ['celery']
+                ):
+                    sent_at = []
+                    for payload in payloads:
+                        sent_at.append(time.perf_counter())
+                        send_verification_email.apply_async(args=[payload])
+                    if not sink.wait_for(len(payloads), options['timeout']):
+                        self.stderr.write(f'Timeout: solo llegaron {len(sink.received)} de {len(payloads)} emails')
+        except Exception as e:
+            raise CommandError(f'No se pudo ejecutar el modo worker con {options["broker"]}: {e}')
+        finally:
+            if previous_broker is None:
+                os.environ.pop('CELERY_BROKER_URL', None)
+            else:
+                os.environ['CELERY_BROKER_URL'] = previous_broker
+        return sent_at
+
+    def summarize(self, payloads, sent_at, sink):
+        latencies = [
+            (sink.received[payload['email']] - started) * 1000
+            for payload, started in zip(payloads, sent_at)
+            if payload['email'] in sink.received
+        ]
+        if not latencies:
+            return {'sent': 0, 'messages_per_second': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0}
+        elapsed = max(sink.received.values()) - sent_at[0]
+        return {
+            'sent': len(latencies),
+            'messages_per_second': len(latencies) / elapsed if elapsed > 0 else 0.0,
+            'p50_ms': _percentile(latencies, 50),
+            'p99_ms': _percentile(latencies, 99),
+        }
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from emailer.email_templates import inline_css, render_email
+
+
+class Command(BaseCommand):
+    help = 'Mide el costo de renderizado por email: plantilla completa vs. precompilada y cacheada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--template', default='verification', choices=['verification', 'winner'])
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        template_base = options['template']
+        fields = {
+            'verification': {'first_name': 'Ana', 'verification_url': 'http://localhost:5173/verify-email/x'},
+            'winner': {'first_name': 'Ana', 'contest_name': 'Sorteo San Valentín 2025'},
+        }[template_base]
+
+        def full_render(i):
+            context = {**fields, 'first_name': f'Ana {i}'}
+            render_to_string(f'emailer/emails/{template_base}.txt', context)
+            inline_css(render_to_string(f'emailer/emails/{template_base}.html', context))
+
+        def cached_render(i):
+            render_email(template_base, **{**fields, 'first_name': f'Ana {i}'})
+
+        cached_render(0)  # Calentar la caché de plantillas
+        for label, render in [('Render completo + CSS inline', full_render), ('Precompilado (caché)', cached_render)]:
+            start = time.perf_counter()
+            for i in range(iterations):
+                render(i)
+            per_email = (time.perf_counter() - start) / iterations * 1_000_000
+            self.stdout.write(f'{label:<30} {per_email:10.1f} µs/email')
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from emailer.models import Contest, ContestStats
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye o reconcilia los contadores de ContestStats desde los participantes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contest', type=int, help='ID del concurso (por defecto todos)')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Solo reportar diferencias sin modificar la base de datos'
+        )
+
+    def handle(self, *args, **options):
+        contests = Contest.objects.all()
+        if options['contest']:
+            contests = contests.filter(id=options['contest'])
+
+        drift_found = False
+        for contest_id in contests.values_list('id', flat=True):
+            with transaction.atomic():
+                expected = ContestStats.compute(contest_id)
+                current = ContestStats.objects.select_for_update().filter(contest_id=contest_id).values(
+                    *ContestStats.COUNTER_FIELDS
+                ).first()
+
+                if current == expected:
+                    self.stdout.write(f'Concurso {contest_id}: contadores correctos')
+                    continue
+
+                drift_found = True
+                self.stdout.write(self.style.WARNING(
+                    f'Concurso {contest_id}: guardado={current} real={expected}'
+                ))
+                if not options['check']:
+                    ContestStats.rebuild(contest_id)
+                    self.stdout.write(self.style.SUCCESS(f'Concurso {contest_id}: contadores reconstruidos'))
+
+        if options['check'] and drift_found:
+            self.stderr.write('Se encontraron diferencias en los contadores')
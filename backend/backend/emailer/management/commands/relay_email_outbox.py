@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from emailer.outbox import relay_outbox
+
+
+class Command(BaseCommand):
+    help = 'Despacha los emails pendientes del outbox (publicando en Celery o enviando por SMTP en lotes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Mensajes por lote (por defecto EMAIL_OUTBOX_BATCH_SIZE)')
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Enviar en este proceso por SMTP (ignora EMAIL_OUTBOX_DELIVERY)'
+        )
+        parser.add_argument(
+            '--loop',
+            type=float,
+            metavar='SEGUNDOS',
+            help='Repetir indefinidamente esperando SEGUNDOS entre lotes vacíos'
+        )
+
+    def handle(self, *args, **options):
+        publish = False if options['sync'] else None
+        while True:
+            total_dispatched = total_failed = 0
+            # Vaciar el outbox lote a lote
+            while True:
+                dispatched, failed = relay_outbox(options['batch_size'], publish=publish)
+                total_dispatched += dispatched
+                total_failed += failed
+                if not dispatched:
+                    break
+
+            if total_dispatched or total_failed or not options['loop']:
+                self.stdout.write(f'Outbox: {total_dispatched} despachados, {total_failed} con error')
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,39 @@
+from celery import current_app
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from emailer.models import EmailDeadLetter
+
+
+class Command(BaseCommand):
+    help = 'Reencola en Celery las tareas de email que agotaron sus reintentos (EmailDeadLetter)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', help='Solo mensajes de esta tarea (p. ej. emailer.tasks.send_verification_email)')
+        parser.add_argument('--limit', type=int, help='Máximo de mensajes a reenviar')
+        parser.add_argument('--dry-run', action='store_true', help='Mostrar cuántos mensajes se reenviarían sin publicarlos')
+
+    def handle(self, *args, **options):
+        letters = EmailDeadLetter.objects.filter(replayed_at__isnull=True).order_by('id')
+        if options['task']:
+            letters = letters.filter(task_name=options['task'])
+        if options['limit']:
+            letters = letters[:options['limit']]
+        letters = list(letters)
+
+        if options['dry_run']:
+            self.stdout.write(f'{len(letters)} mensajes pendientes de reenviar')
+            return
+
+        replayed, failed = [], 0
+        for letter in letters:
+            try:
+                current_app.tasks[letter.task_name].apply_async(letter.args, letter.kwargs)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'No se pudo reenviar #{letter.id} ({letter.task_name}): {e}')
+                continue
+            letter.replayed_at = timezone.now()
+            replayed.append(letter)
+
+        EmailDeadLetter.objects.bulk_update(replayed, ['replayed_at'])
+        self.stdout.write(self.style.SUCCESS(f'{len(replayed)} mensajes reenviados, {failed} con error'))
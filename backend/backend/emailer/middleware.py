@@ -1,6 +1,6 @@
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
-from .jwt_utils import JWTService
+from .authentication import JWTAuthError, authenticate_jwt_request, is_admin_user
 
 class JWTAuthenticationMiddleware(MiddlewareMixin):
     """Middleware para autenticación JWT"""
@@ -12,6 +12,7 @@ class JWTAuthenticationMiddleware(MiddlewareMixin):
             '/api/admin/participants/',
             '/api/admin/select-winner/',
             '/api/admin/contest-stats/',
+            '/api/admin/draws/',
         ]
         
         print(f"DEBUG Middleware - Ruta solicitada: {request.path}")
@@ -35,34 +36,17 @@ class JWTAuthenticationMiddleware(MiddlewareMixin):
                 'code': 'TOKEN_REQUIRED'
             }, status=401)
         
-        token = auth_header.split(' ')[1]
-        print(f"DEBUG Middleware - Token extraído: {token}")
-        
-        # Verificar token
-        payload, error = JWTService.decode_token(token)
-        if error or not payload:
-            return JsonResponse({
-                'error': 'Token inválido o expirado',
-                'code': 'INVALID_TOKEN'
-            }, status=401)
-        
-        # Obtener usuario del payload
+        # Decodificar, revisar lista negra y cargar usuario (una sola vez por request)
         try:
-            from .models import CustomUser
-            user = CustomUser.objects.get(id=payload['user_id'])
-            if not user.is_active:
-                return JsonResponse({
-                    'error': 'Usuario inactivo',
-                    'code': 'USER_INACTIVE'
-                }, status=401)
-        except CustomUser.DoesNotExist:
+            user, payload = authenticate_jwt_request(request)
+        except JWTAuthError as e:
             return JsonResponse({
-                'error': 'Usuario no encontrado',
-                'code': 'USER_NOT_FOUND'
-            }, status=401)
+                'error': e.message,
+                'code': e.code
+            }, status=e.status_code)
         
         # Verificar que sea administrador
-        if not (user.is_staff or user.is_superuser):
+        if not is_admin_user(user):
             print(f"DEBUG Middleware - Usuario sin permisos de admin: {user.email}")
             return JsonResponse({
                 'error': 'Acceso denegado. Se requieren permisos de administrador',
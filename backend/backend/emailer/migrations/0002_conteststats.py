@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emailer', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContestStats',
+            fields=[
+                ('contest', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='emailer.contest')),
+                ('registered_count', models.PositiveIntegerField(default=0)),
+                ('email_verified_count', models.PositiveIntegerField(default=0)),
+                ('password_set_count', models.PositiveIntegerField(default=0)),
+                ('eligible_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
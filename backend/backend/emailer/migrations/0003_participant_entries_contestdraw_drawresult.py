@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emailer', '0002_conteststats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='entries',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='ContestDraw',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('winners_count', models.PositiveIntegerField(default=1)),
+                ('alternates_count', models.PositiveIntegerField(default=0)),
+                ('weighted', models.BooleanField(default=False)),
+                ('total_eligible', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='draws', to='emailer.contest')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='draws_created', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DrawResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('winner', 'Ganador'), ('alternate', 'Suplente')], max_length=10)),
+                ('position', models.PositiveIntegerField()),
+                ('draw', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='emailer.contestdraw')),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='emailer.participant')),
+            ],
+            options={
+                'ordering': ['draw', 'role', 'position'],
+                'unique_together': {('draw', 'participant'), ('draw', 'role', 'position')},
+            },
+        ),
+    ]
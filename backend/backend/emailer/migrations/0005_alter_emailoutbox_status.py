@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emailer', '0004_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendiente'), ('dispatched', 'Despachado'), ('sent', 'Enviado'), ('failed', 'Fallido')], default='pending', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emailer', '0006_emaildeadletter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='kind',
+            field=models.CharField(choices=[('verification', 'Verificación de email'), ('winner', 'Notificación de ganador')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+def deactivate_duplicate_active_contests(apps, schema_editor):
+    """Deja activo solo el concurso activo más antiguo antes de crear la restricción"""
+    Contest = apps.get_model('emailer', 'Contest')
+    active_ids = list(Contest.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+    Contest.objects.filter(id__in=active_ids[1:]).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emailer', '0008_emailverification_token_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(deactivate_duplicate_active_contests, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='contest',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('is_active',), name='unique_active_contest'),
+        ),
+    ]
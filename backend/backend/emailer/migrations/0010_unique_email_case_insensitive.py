@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:26
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def check_case_insensitive_duplicates(apps, schema_editor):
+    """
+    El registro comparaba el email distinguiendo mayúsculas, así que puede haber
+    pares como A@x.com / a@x.com. No se fusionan automáticamente (cada uno puede
+    tener participación, tokens o sorteos): se listan para resolverlos a mano.
+    """
+    CustomUser = apps.get_model('emailer', 'CustomUser')
+    duplicates = list(
+        CustomUser.objects
+        .annotate(email_lower=django.db.models.functions.text.Lower('email'))
+        .values('email_lower')
+        .annotate(total=models.Count('id'))
+        .filter(total__gt=1)
+        .values_list('email_lower', flat=True)
+    )
+    if duplicates:
+        raise RuntimeError(
+            "No se puede crear unique_email_case_insensitive: hay usuarios cuyo email "
+            "solo difiere en mayúsculas/minúsculas. Unifica o borra los duplicados y "
+            f"vuelve a ejecutar migrate: {', '.join(sorted(duplicates))}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('emailer', '0009_unique_active_contest'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_case_insensitive_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='unique_email_case_insensitive'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emailer', '0010_unique_email_case_insensitive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='claim_token',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendiente'), ('sending', 'Enviando'), ('dispatched', 'Despachado'), ('sent', 'Enviado'), ('failed', 'Fallido')], default='pending', max_length=10),
+        ),
+    ]
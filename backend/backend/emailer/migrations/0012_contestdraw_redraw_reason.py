@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emailer', '0011_emailoutbox_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contestdraw',
+            name='redraw_reason',
+            field=models.TextField(blank=True),
+        ),
+    ]
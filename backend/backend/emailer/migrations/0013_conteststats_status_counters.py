@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+def drop_stale_stats(apps, schema_editor):
+    """
+    Los contadores por estado nuevos empiezan en 0: se borran las filas y
+    ContestStats.rebuild las recalcula completas en la siguiente lectura o cambio
+    """
+    apps.get_model('emailer', 'ContestStats').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emailer', '0012_contestdraw_redraw_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conteststats',
+            name='email_pending_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conteststats',
+            name='fully_verified_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conteststats',
+            name='not_eligible_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conteststats',
+            name='password_pending_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(drop_stale_stats, migrations.RunPython.noop),
+    ]
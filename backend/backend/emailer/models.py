@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, F, Q
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 import uuid
 from django.utils import timezone
@@ -15,6 +17,12 @@ class CustomUser(AbstractUser):
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Unicidad sin distinguir mayúsculas: el registro se apoya en esta restricción
+            models.UniqueConstraint(Lower('email'), name='unique_email_case_insensitive'),
+        ]
 
 class Contest(models.Model):
     """Modelo para el concurso/sorteo"""
@@ -26,6 +34,12 @@ class Contest(models.Model):
     winner = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='won_contests')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        constraints = [
+            # Un solo concurso activo (índice único parcial donde la base lo soporta)
+            models.UniqueConstraint(fields=['is_active'], condition=models.Q(is_active=True), name='unique_active_contest'),
+        ]
+    
     def __str__(self):
         return self.name
 
@@ -35,6 +49,7 @@ class Participant(models.Model):
     contest = models.ForeignKey(Contest, on_delete=models.CASCADE)
     registered_at = models.DateTimeField(auto_now_add=True)
     is_eligible = models.BooleanField(default=False)  # Solo elegible si email está verificado
+    entries = models.PositiveIntegerField(default=1)  # Peso en sorteos ponderados
     
     class Meta:
         unique_together = ['user', 'contest']
@@ -45,11 +60,18 @@ class Participant(models.Model):
 class EmailVerification(models.Model):
     """Tokens de verificación de email"""
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    token = models.UUIDField(default=uuid.uuid4, editable=False)
+    token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     is_used = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            # Índice parcial para la búsqueda token=..., is_used=False (donde la base lo soporta)
+            models.Index(fields=['token'], condition=models.Q(is_used=False), name='emailverif_unused_token_idx'),
+            models.Index(fields=['expires_at'], name='emailverif_expires_at_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.expires_at:
             self.expires_at = timezone.now() + timezone.timedelta(hours=24)
@@ -58,5 +80,223 @@ class EmailVerification(models.Model):
     def is_expired(self):
         return timezone.now() > self.expires_at
     
+    @classmethod
+    def purge_stale(cls, batch_size=1000):
+        """
+        Borra los tokens usados o expirados en lotes de `batch_size` filas, para
+        no bloquear la tabla con un solo DELETE grande. Devuelve cuántos borró.
+        """
+        stale = cls.objects.filter(models.Q(is_used=True) | models.Q(expires_at__lt=timezone.now()))
+        deleted = 0
+        while True:
+            ids = list(stale.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += cls.objects.filter(id__in=ids).delete()[0]
+    
+    def __str__(self):
+        return f"Verification for {self.user.email}"
+
+class ContestStats(models.Model):
+    """Contadores del concurso mantenidos de forma incremental"""
+    contest = models.OneToOneField(Contest, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    registered_count = models.PositiveIntegerField(default=0)
+    email_verified_count = models.PositiveIntegerField(default=0)
+    password_set_count = models.PositiveIntegerField(default=0)
+    eligible_count = models.PositiveIntegerField(default=0)
+    # Un contador exacto por estado de verificación (mismo orden que _get_verification_status)
+    email_pending_count = models.PositiveIntegerField(default=0)
+    password_pending_count = models.PositiveIntegerField(default=0)
+    not_eligible_count = models.PositiveIntegerField(default=0)
+    fully_verified_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    COUNTER_FIELDS = [
+        'registered_count', 'email_verified_count', 'password_set_count', 'eligible_count',
+        'email_pending_count', 'password_pending_count', 'not_eligible_count', 'fully_verified_count',
+    ]
+    STATUS_FIELDS = {
+        'Email pendiente': 'email_pending_count',
+        'Contraseña pendiente': 'password_pending_count',
+        'No elegible': 'not_eligible_count',
+        'Completamente verificado': 'fully_verified_count',
+    }
+    
+    @staticmethod
+    def participant_deltas(is_email_verified, has_password, is_eligible, sign=1):
+        """Deltas de todos los contadores para un participante en ese estado (sign=-1 para restarlo)"""
+        if not is_email_verified:
+            status_field = 'email_pending_count'
+        elif not has_password:
+            status_field = 'password_pending_count'
+        elif not is_eligible:
+            status_field = 'not_eligible_count'
+        else:
+            status_field = 'fully_verified_count'
+        return {
+            'registered_count': sign,
+            'email_verified_count': sign * int(is_email_verified),
+            'password_set_count': sign * int(has_password),
+            'eligible_count': sign * int(is_eligible),
+            status_field: sign,
+        }
+    
+    @classmethod
+    def increment(cls, contest_id, create_missing=True, **deltas):
+        """
+        Suma los deltas indicados con expresiones F() (UPDATE atómico en la BD).
+        Debe llamarse dentro de la misma transacción que el cambio que lo origina.
+        Con create_missing=False no se crea la fila si no existe (se reconstruirá
+        completa la próxima vez que se lea).
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        updates = {field: F(field) + delta for field, delta in deltas.items()}
+        updates['updated_at'] = timezone.now()
+        if not cls.objects.filter(contest_id=contest_id).update(**updates) and create_missing:
+            # Primera vez: se crea la fila reconstruyendo desde cero
+            cls.rebuild(contest_id)
+    
+    @classmethod
+    def move(cls, contest_id, before, after):
+        """Pasa un participante del estado `before` al `after` (tuplas verificado, contraseña, elegible)"""
+        deltas = cls.participant_deltas(*before, sign=-1)
+        for field, delta in cls.participant_deltas(*after).items():
+            deltas[field] = deltas.get(field, 0) + delta
+        cls.increment(contest_id, **deltas)
+    
+    @classmethod
+    def compute(cls, contest_id):
+        """Calcula los contadores reales con una consulta agregada"""
+        has_password = ~Q(user__password='')
+        verified = Q(user__is_email_verified=True)
+        return Participant.objects.filter(contest_id=contest_id).aggregate(
+            registered_count=Count('id'),
+            email_verified_count=Count('id', filter=verified),
+            password_set_count=Count('id', filter=has_password),
+            eligible_count=Count('id', filter=Q(is_eligible=True)),
+            email_pending_count=Count('id', filter=~verified),
+            password_pending_count=Count('id', filter=verified & ~has_password),
+            not_eligible_count=Count('id', filter=verified & has_password & Q(is_eligible=False)),
+            fully_verified_count=Count('id', filter=verified & has_password & Q(is_eligible=True)),
+        )
+    
+    @classmethod
+    def rebuild(cls, contest_id):
+        """Reconstruye la fila de contadores a partir de los participantes"""
+        stats, _ = cls.objects.update_or_create(contest_id=contest_id, defaults=cls.compute(contest_id))
+        return stats
+    
+    def as_dict(self):
+        """Contadores en el formato de la API, incluyendo los estados de verificación"""
+        return {
+            'total_count': self.registered_count,
+            'verified_count': self.email_verified_count,
+            'password_count': self.password_set_count,
+            'eligible_count': self.eligible_count,
+            'verification_status': {
+                status_name: getattr(self, field) for status_name, field in self.STATUS_FIELDS.items()
+            }
+        }
+    
+    def __str__(self):
+        return f"Estadísticas de {self.contest_id}"
+
+
+class ContestDraw(models.Model):
+    """Sorteo de varios ganadores y suplentes para un concurso"""
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE, related_name='draws')
+    winners_count = models.PositiveIntegerField(default=1)
+    alternates_count = models.PositiveIntegerField(default=0)
+    weighted = models.BooleanField(default=False)
+    total_eligible = models.PositiveIntegerField(default=0)
+    redraw_reason = models.TextField(blank=True)  # Motivo obligatorio si repite un sorteo anterior
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='draws_created')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Sorteo {self.id} - {self.contest.name}"
+
+class DrawResult(models.Model):
+    """Resultado ordenado de un sorteo (ganador o suplente)"""
+    ROLE_WINNER = 'winner'
+    ROLE_ALTERNATE = 'alternate'
+    ROLE_CHOICES = [
+        (ROLE_WINNER, 'Ganador'),
+        (ROLE_ALTERNATE, 'Suplente'),
+    ]
+    
+    draw = models.ForeignKey(ContestDraw, on_delete=models.CASCADE, related_name='results')
+    participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    position = models.PositiveIntegerField()  # 1..K para ganadores, 1..M para suplentes
+    
+    class Meta:
+        unique_together = [['draw', 'participant'], ['draw', 'role', 'position']]
+        ordering = ['draw', 'role', 'position']
+    
+    def __str__(self):
+        return f"{self.get_role_display()} #{self.position} - sorteo {self.draw_id}"
+
+
+class EmailOutbox(models.Model):
+    """
+    Bandeja de salida transaccional: el email se registra en la misma
+    transacción que lo origina y un relay lo publica después del commit.
+    """
+    KIND_VERIFICATION = 'verification'
+    KIND_WINNER = 'winner'
+    KIND_CHOICES = [
+        (KIND_VERIFICATION, 'Verificación de email'),
+        (KIND_WINNER, 'Notificación de ganador'),
+    ]
+    
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'  # Reclamado por un relay, en curso
+    STATUS_DISPATCHED = 'dispatched'  # Publicado en Celery
+    STATUS_SENT = 'sent'  # Enviado directamente por SMTP
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendiente'),
+        (STATUS_SENDING, 'Enviando'),
+        (STATUS_DISPATCHED, 'Despachado'),
+        (STATUS_SENT, 'Enviado'),
+        (STATUS_FAILED, 'Fallido'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    args = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'available_at'])]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} ({self.status})"
+
+
+class EmailDeadLetter(models.Model):
+    """
+    Tareas de email que agotaron sus reintentos. Se guardan el nombre de la
+    tarea y sus argumentos para reenviarlas con manage.py replay_dead_letters.
+    """
+    task_name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    retries = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    replayed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['replayed_at', 'id'])]
+    
     def __str__(self):
-        return f"Verification for {self.user.email}"
\ No newline at end of file
+        return f"{self.task_name} #{self.id}"
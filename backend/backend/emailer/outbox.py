@@ -0,0 +1,182 @@
+import logging
+import uuid
+from celery.utils.time import get_exponential_backoff_interval
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import CustomUser, EmailDeadLetter, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(kind, *args):
+    """
+    Registra un email en la bandeja de salida. Debe llamarse dentro de la
+    transacción de la request: no toca el broker ni el servidor SMTP.
+    """
+    return EmailOutbox.objects.create(kind=kind, args=list(args))
+
+
+def _get_task(kind):
+    from .tasks import send_verification_email, send_winner_notification_email
+    tasks = {
+        EmailOutbox.KIND_VERIFICATION: send_verification_email,
+        EmailOutbox.KIND_WINNER: send_winner_notification_email,
+    }
+    return tasks[kind]
+
+
+def _build_messages(messages):
+    """
+    Construye los EmailMultiAlternatives de un lote a partir de los payloads.
+    Los mensajes de verificación antiguos (email, token) se completan con una
+    sola consulta. Devuelve una lista paralela con el email o el error.
+    """
+    from .tasks import build_verification_email, build_winner_email, verification_payload
+    builders = {
+        EmailOutbox.KIND_VERIFICATION: build_verification_email,
+        EmailOutbox.KIND_WINNER: build_winner_email,
+    }
+
+    legacy_emails = [
+        m.args[0] for m in messages
+        if m.kind == EmailOutbox.KIND_VERIFICATION and not isinstance(m.args[0], dict)
+    ]
+    users = CustomUser.objects.in_bulk(legacy_emails, field_name='email') if legacy_emails else {}
+
+    built = []
+    for message in messages:
+        payload = message.args[0]
+        try:
+            if not isinstance(payload, dict):
+                user = users.get(payload)
+                if user is None:
+                    raise ValueError(f"Usuario con email {payload} no encontrado")
+                payload = verification_payload(user, message.args[1])
+            built.append(builders[message.kind](payload))
+        except Exception as e:
+            built.append(e)
+    return built
+
+
+def _deliver(messages, publish):
+    """Publica en Celery o envía por SMTP; devuelve None o la excepción por mensaje"""
+    if publish:
+        from .broker import publish_task
+        errors = []
+        for message in messages:
+            try:
+                publish_task(_get_task(message.kind), *message.args)
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    from .mailer import send_messages_bulk
+
+    built = _build_messages(messages)
+    to_send = [email for email in built if not isinstance(email, Exception)]
+    send_errors = iter(send_messages_bulk(to_send))
+    return [email if isinstance(email, Exception) else next(send_errors) for email in built]
+
+
+def _claim_batch(batch_size, now):
+    """
+    Reclama un lote con un UPDATE condicional (solo filas aún pendientes o con
+    la reserva vencida) y devuelve las filas que quedaron marcadas con el token
+    de este relay. Cada sentencia es una transacción corta: ningún relay
+    mantiene bloqueada la base mientras habla con SMTP o con el broker.
+    """
+    claimable = (
+        Q(status=EmailOutbox.STATUS_PENDING) |
+        Q(status=EmailOutbox.STATUS_SENDING)  # Relay caído a mitad de envío
+    ) & Q(available_at__lte=now)
+    ids = list(
+        EmailOutbox.objects.filter(claimable).order_by('id').values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    claimed = EmailOutbox.objects.filter(claimable, id__in=ids).update(
+        status=EmailOutbox.STATUS_SENDING,
+        claim_token=token,
+        attempts=F('attempts') + 1,
+        available_at=now + timezone.timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_SECONDS)
+    )
+    if not claimed:
+        return []  # Otro relay se llevó el lote entre el SELECT y el UPDATE
+    return list(EmailOutbox.objects.filter(id__in=ids, claim_token=token).order_by('id'))
+
+
+def relay_outbox(batch_size=None, publish=None):
+    """
+    Despacha un lote de mensajes pendientes de la bandeja de salida.
+    Con publish=True los publica en Celery; con publish=False los envía desde
+    este proceso reutilizando la conexión SMTP. Por defecto se usa
+    EMAIL_OUTBOX_DELIVERY. El lote se reclama primero (estado `sending`), se
+    entrega fuera de toda transacción y el resultado se guarda al final.
+    Los fallos transitorios se reintentan con backoff con jitter hasta
+    EMAIL_OUTBOX_MAX_ATTEMPTS; los permanentes (SMTP 5xx) y los agotados pasan
+    a EmailDeadLetter. Devuelve (despachados, fallidos).
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    if publish is None:
+        publish = settings.EMAIL_OUTBOX_DELIVERY == 'publish'
+    if publish:
+        from .broker import get_broker_breaker
+        if get_broker_breaker().is_open():
+            return 0, 0  # Broker caído: los mensajes esperan sin gastar intentos
+    now = timezone.now()
+
+    messages = _claim_batch(batch_size, now)
+    if not messages:
+        return 0, 0
+
+    errors = _deliver(messages, publish)
+
+    from .tasks import is_permanent_email_error
+    delivered, failed, dead_letters = [], [], []
+    for message, error in zip(messages, errors):
+        message.claim_token = ''
+        if error is None:
+            message.status = EmailOutbox.STATUS_DISPATCHED if publish else EmailOutbox.STATUS_SENT
+            message.dispatched_at = timezone.now()
+            delivered.append(message)
+            continue
+
+        message.last_error = str(error)
+        # Mismo criterio que EmailTask: un rechazo permanente (5xx) no se
+        # reintenta; los agotados quedan en EmailDeadLetter para replay_dead_letters
+        if is_permanent_email_error(error) or message.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            message.status = EmailOutbox.STATUS_FAILED
+            dead_letters.append(EmailDeadLetter(
+                task_name=_get_task(message.kind).name,
+                args=message.args,
+                error=message.last_error,
+                retries=message.attempts - 1
+            ))
+        else:
+            message.status = EmailOutbox.STATUS_PENDING
+            message.available_at = now + timezone.timedelta(seconds=_retry_delay(message.attempts))
+        failed.append(message)
+        logger.warning(f"Outbox: error despachando mensaje {message.id}: {error}")
+
+    with transaction.atomic():
+        if delivered:
+            EmailOutbox.objects.bulk_update(delivered, ['status', 'claim_token', 'dispatched_at'])
+        if failed:
+            EmailOutbox.objects.bulk_update(failed, ['status', 'claim_token', 'last_error', 'available_at'])
+        if dead_letters:
+            EmailDeadLetter.objects.bulk_create(dead_letters)
+
+    logger.info(f"Outbox: {len(delivered)} despachados, {len(failed)} con error")
+    return len(delivered), len(failed)
+
+
+def _retry_delay(attempts):
+    """Backoff exponencial con jitter completo, como retry_backoff/retry_jitter de EmailTask"""
+    return max(1, get_exponential_backoff_interval(
+        factor=1, retries=attempts, maximum=settings.EMAIL_TASK_RETRY_BACKOFF_MAX, full_jitter=True
+    ))
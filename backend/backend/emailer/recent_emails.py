@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class RecentEmailFilter:
+    """
+    Emails registrados hace poco en este proceso, para rechazar ráfagas de
+    registros duplicados sin consultar la base. Es solo un atajo: la
+    restricción única sobre el email sigue siendo la que decide.
+    """
+    
+    def __init__(self, ttl_seconds, max_entries=10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # email normalizado -> expiración (time.monotonic)
+        self._lock = threading.Lock()
+    
+    def seen(self, email):
+        if self.ttl_seconds <= 0:
+            return False
+        key = email.lower()
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False
+            return True
+    
+    def remember(self, email):
+        if self.ttl_seconds <= 0:
+            return
+        key = email.lower()
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def forget(self, email):
+        with self._lock:
+            self._entries.pop(email.lower(), None)
+
+
+_recent_emails = None
+
+def get_recent_emails():
+    global _recent_emails
+    if _recent_emails is None:
+        _recent_emails = RecentEmailFilter(settings.REGISTRATION_RECENT_EMAILS_SECONDS)
+    return _recent_emails
+
+@receiver(setting_changed)
+def _reset_recent_emails(setting, **kwargs):
+    global _recent_emails
+    if setting == 'REGISTRATION_RECENT_EMAILS_SECONDS':
+        _recent_emails = None
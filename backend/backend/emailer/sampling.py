@@ -0,0 +1,34 @@
+import heapq
+import math
+import random
+
+
+def reservoir_sample(items, size, weighted=False, rng=None):
+    """
+    Muestreo por reservorio en una sola pasada (algoritmo A-Res de
+    Efraimidis-Spirakis). Recibe un iterable de (id, peso) y devuelve hasta
+    `size` ids ordenados al azar; con weighted=False todos pesan lo mismo.
+    La memoria usada es O(size) sin importar el tamaño del iterable.
+    """
+    if size <= 0:
+        return []
+
+    rng = rng or random.SystemRandom()
+    heap = []  # min-heap de (clave, id) con las `size` claves más altas
+
+    for item_id, weight in items:
+        if weighted:
+            if not weight or weight <= 0:
+                continue
+            # log(u) / w conserva el orden de u ** (1 / w) sin perder precisión
+            key = math.log(1.0 - rng.random()) / weight
+        else:
+            key = rng.random()
+
+        if len(heap) < size:
+            heapq.heappush(heap, (key, item_id))
+        elif key > heap[0][0]:
+            heapq.heapreplace(heap, (key, item_id))
+
+    # Mayor clave primero: el orden de las claves es el ranking del sorteo
+    return [item_id for key, item_id in sorted(heap, reverse=True)]
@@ -1,7 +1,30 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.db import IntegrityError, transaction
 from .models import CustomUser, Contest, Participant, EmailVerification
+from .recent_emails import get_recent_emails
+from .signed_tokens import VerificationLinkError, resolve_verification_token
+
+def normalize_email(value):
+    """Email sin espacios y con el dominio en minúsculas (la unicidad ignora mayúsculas)"""
+    return CustomUser.objects.normalize_email(value.strip())
+
+def create_user_unique_email(duplicate_message, **fields):
+    """
+    Crea el usuario confiando en la restricción única del email en vez de
+    consultar antes. Un duplicado se traduce en ValidationError sobre `email`.
+    """
+    try:
+        with transaction.atomic():
+            user = CustomUser.objects.create(**fields)
+    except IntegrityError:
+        get_recent_emails().remember(fields['email'])
+        raise serializers.ValidationError({'email': [duplicate_message]})
+    
+    # Solo cuenta como registrado si la transacción de la request se confirma
+    transaction.on_commit(lambda: get_recent_emails().remember(fields['email']))
+    return user
 
 class ContestRegistrationSerializer(serializers.ModelSerializer):
     """Serializer para el registro público en el concurso"""
@@ -9,17 +32,19 @@ class ContestRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['email', 'first_name', 'last_name', 'phone']
+        # Sin UniqueValidator: el duplicado lo detecta la restricción al insertar
+        extra_kwargs = {'email': {'validators': []}}
         
     def validate_email(self, value):
-        if CustomUser.objects.filter(email=value).exists():
+        value = normalize_email(value)
+        if get_recent_emails().seen(value):
             raise serializers.ValidationError("Este email ya está registrado.")
         return value
     
     def create(self, validated_data):
         # Crear usuario con username igual al email, sin contraseña inicialmente
         validated_data['username'] = validated_data['email']
-        user = CustomUser.objects.create(**validated_data)
-        return user
+        return create_user_unique_email("Este email ya está registrado.", **validated_data)
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """Serializer para el registro inicial del usuario (admin)"""
@@ -29,11 +54,10 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['email', 'first_name', 'last_name', 'phone', 'password', 'password_confirm']
+        extra_kwargs = {'email': {'validators': []}}
         
     def validate_email(self, value):
-        if CustomUser.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Este email ya está registrado.")
-        return value
+        return normalize_email(value)
     
     def validate(self, attrs):
         # En el registro inicial, no se requiere contraseña
@@ -50,7 +74,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         
         # Crear usuario con username igual al email
         validated_data['username'] = validated_data['email']
-        user = CustomUser.objects.create(**validated_data)
+        user = create_user_unique_email("Este email ya está registrado.", **validated_data)
         
         if password:
             user.set_password(password)
@@ -60,10 +84,17 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
 class PasswordCreationSerializer(serializers.Serializer):
     """Serializer para crear contraseña después de verificar email"""
-    token = serializers.UUIDField()
+    token = serializers.CharField()  # UUID o enlace firmado (emailer.signed_tokens)
     password = serializers.CharField(write_only=True)
     password_confirm = serializers.CharField(write_only=True)
     
+    def validate_token(self, value):
+        """Devuelve el UUID de la verificación; los enlaces firmados se validan sin consultar la base"""
+        try:
+            return resolve_verification_token(value)
+        except VerificationLinkError as e:
+            raise serializers.ValidationError(e.message)
+    
     def validate(self, attrs):
         if attrs['password'] != attrs['password_confirm']:
             raise serializers.ValidationError("Las contraseñas no coinciden.")
@@ -127,11 +158,10 @@ class AdminCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['email', 'first_name', 'last_name', 'password', 'password_confirm']
+        extra_kwargs = {'email': {'validators': []}}
         
     def validate_email(self, value):
-        if CustomUser.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Ya existe un administrador con este email.")
-        return value
+        return normalize_email(value)
     
     def validate(self, attrs):
         if attrs['password'] != attrs['password_confirm']:
@@ -151,7 +181,7 @@ class AdminCreateSerializer(serializers.ModelSerializer):
         validated_data['is_superuser'] = True  # Permiso de superusuario
         validated_data['is_email_verified'] = True  # Admin ya está verificado
         
-        user = CustomUser.objects.create(**validated_data)
+        user = create_user_unique_email("Ya existe un administrador con este email.", **validated_data)
         user.set_password(password)
         user.save()
         
@@ -180,4 +210,17 @@ class AdminLoginSerializer(serializers.Serializer):
         else:
             raise serializers.ValidationError("Email y contraseña son requeridos.")
         
-        return attrs
\ No newline at end of file
+        return attrs
+
+class ContestDrawSerializer(serializers.Serializer):
+    """Serializer para sortear varios ganadores y suplentes"""
+    winners = serializers.IntegerField(min_value=1, max_value=100, default=1)
+    alternates = serializers.IntegerField(min_value=0, max_value=100, default=0)
+    weighted = serializers.BooleanField(default=False)
+    redraw = serializers.BooleanField(default=False)
+    reason = serializers.CharField(required=False, allow_blank=True, max_length=500)
+    
+    def validate(self, attrs):
+        if attrs['redraw'] and not attrs.get('reason', '').strip():
+            raise serializers.ValidationError({'reason': ["Indica el motivo para repetir el sorteo."]})
+        return attrs
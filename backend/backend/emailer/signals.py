@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .authentication import invalidate_cached_user
+from .contests import invalidate_active_contest
+from .models import Contest, ContestStats, CustomUser, Participant
+from .recent_emails import get_recent_emails
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_cache(sender, instance, signal, **kwargs):
+    """
+    Invalida el usuario cacheado por la autenticación JWT y, si se borra,
+    lo quita del filtro de emails recientes para que pueda registrarse de nuevo
+    """
+    invalidate_cached_user(instance.pk)
+    if signal is post_delete and instance.email:
+        get_recent_emails().forget(instance.email)
+
+@receiver(post_save, sender=Contest)
+@receiver(post_delete, sender=Contest)
+def invalidate_contest_cache(sender, instance, **kwargs):
+    """Invalida el concurso activo cacheado por el registro"""
+    invalidate_active_contest()
+
+@receiver(post_delete, sender=Participant)
+def discount_deleted_participant(sender, instance, **kwargs):
+    """
+    Resta el participante borrado (directamente o en cascada al borrar el
+    usuario) de los contadores de su concurso, en la misma transacción
+    """
+    # En la cascada de un usuario su fila aún existe: se borra después que el participante
+    user = CustomUser.objects.filter(pk=instance.user_id).values('is_email_verified', 'password').first()
+    if user is None:
+        return
+    ContestStats.increment(
+        instance.contest_id,
+        create_missing=False,
+        **ContestStats.participant_deltas(user['is_email_verified'], bool(user['password']), instance.is_eligible, sign=-1)
+    )
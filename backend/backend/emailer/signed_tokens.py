@@ -0,0 +1,59 @@
+import uuid
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+SALT = 'emailer.email-verification'
+
+
+class VerificationLinkError(Exception):
+    """Enlace firmado expirado, alterado o mal formado"""
+
+    def __init__(self, message, expired=False):
+        super().__init__(message)
+        self.message = message
+        self.expired = expired
+
+
+def make_verification_token(verification):
+    """
+    Token para el enlace del email. Con EMAIL_VERIFICATION_SIGNED_LINKS el
+    enlace lleva firmados (HMAC con SECRET_KEY) el id del usuario, la
+    expiración y el UUID de la verificación como nonce; así se valida sin
+    consultar la base. La firma no cifra: el token va en claro (base64) en la
+    URL y en los logs, por eso no incluye email ni nombre.
+    """
+    if not settings.EMAIL_VERIFICATION_SIGNED_LINKS:
+        return str(verification.token)
+    
+    claims = {
+        'u': verification.user_id,
+        't': verification.token.hex,
+        'e': int(verification.expires_at.timestamp()),
+    }
+    return signing.dumps(claims, salt=SALT)
+
+
+def read_signed_token(value):
+    """Verifica firma y expiración (solo CPU). Devuelve los claims o lanza VerificationLinkError"""
+    try:
+        claims = signing.loads(value, salt=SALT)
+        expires_at = int(claims['e'])
+        uuid.UUID(hex=claims['t'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise VerificationLinkError('Token de verificación inválido.')
+    
+    if timezone.now().timestamp() > expires_at:
+        raise VerificationLinkError('El enlace de verificación ha expirado.', expired=True)
+    return claims
+
+
+def resolve_verification_token(value):
+    """
+    Devuelve el UUID de EmailVerification para un token de enlace, sea el UUID
+    directo (enlaces clásicos) o un token firmado.
+    """
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return uuid.UUID(hex=read_signed_token(value)['t'])
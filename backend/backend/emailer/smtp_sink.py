@@ -0,0 +1,87 @@
+import socketserver
+import threading
+import time
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Habla lo mínimo de SMTP para aceptar y descartar los mensajes"""
+    
+    def reply(self, line):
+        if self.server.sink.latency:
+            time.sleep(self.server.sink.latency)  # Simula el RTT de un servidor real
+        self.wfile.write(f'{line}\r\n'.encode())
+    
+    def handle(self):
+        sink = self.server.sink
+        recipients = []
+        self.reply('220 smtp-sink listo')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', 'ignore').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-smtp-sink\r\n250 8BITMIME')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 Fin con <CRLF>.<CRLF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                sink.record(recipients)
+                recipients = []
+                self.reply('250 OK encolado')
+            elif verb == 'RSET':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Adiós')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SMTPSink:
+    """
+    Servidor SMTP local que descarta los mensajes y guarda cuándo llegó cada
+    destinatario (time.perf_counter). Para benchmarks del envío de emails:
+
+        with SMTPSink() as sink:
+            ... EMAIL_HOST='127.0.0.1', EMAIL_PORT=sink.port ...
+            sink.wait_for(n)
+    """
+    
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.latency = latency
+        self.received = {}  # destinatario -> instante de recepción
+        self._condition = threading.Condition()
+        self._server = _SinkServer((host, port), _SinkHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+    
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def record(self, recipients):
+        now = time.perf_counter()
+        with self._condition:
+            for recipient in recipients:
+                self.received[recipient] = now
+            self._condition.notify_all()
+    
+    def wait_for(self, count, timeout):
+        """Espera hasta recibir `count` destinatarios; devuelve True si llegaron"""
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self.received) >= count, timeout)
@@ -1,3 +1,905 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import smtplib
+import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail, signing
+from django.core.management import call_command
+from django.core.mail import get_connection
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Contest, ContestDraw, ContestStats, EmailDeadLetter, EmailOutbox, EmailVerification, Participant
+from .backends import AsyncSMTPEmailBackend
+from .contests import DEFAULT_CONTEST, get_active_contest
+from .broker import BrokerUnavailable, CircuitBreaker, publish_or_spool, publish_task
+from .email_templates import render_email
+from .jwt_utils import BlacklistUnavailable, InMemoryBlacklistStore, JWTService, RedisBlacklistStore, TokenBlacklistService, get_blacklist_store
+from .mailer import send_messages_bulk
+from .outbox import _claim_batch, enqueue_email, relay_outbox
+from .sampling import reservoir_sample
+from .signed_tokens import SALT as SIGNED_TOKEN_SALT, make_verification_token
+from .tasks import OUTBOX_RELAY_LOCK_KEY, relay_email_outbox, send_verification_email, send_winner_notification_email, verification_payload, winner_payload
+
+
+@override_settings(JWT_BLACKLIST_BACKEND='memory')
+class AdminAPITestCase(TestCase):
+    """Base con un administrador autenticado y participantes de prueba"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create(
+            username='admin@hotel.com', email='admin@hotel.com',
+            first_name='Admin', last_name='Hotel', is_staff=True, is_superuser=True
+        )
+        cls.contest = Contest.objects.create(
+            name='Sorteo', description='Test',
+            start_date=timezone.now() - timezone.timedelta(days=1),
+            end_date=timezone.now() + timezone.timedelta(days=30)
+        )
+        for i in range(5):
+            user = CustomUser.objects.create(
+                username=f'user{i}@test.com', email=f'user{i}@test.com',
+                first_name=f'User{i}', last_name='Test', is_email_verified=i % 2 == 0
+            )
+            Participant.objects.create(user=user, contest=cls.contest, is_eligible=i % 2 == 0)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        token = JWTService.generate_token(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+
+class AdminParticipantsListTests(AdminAPITestCase):
+    """Paginación por cursor de la lista de participantes"""
+
+    def test_cursor_pagination_walks_all_participants(self):
+        seen = []
+        response = self.client.get('/api/admin/participants/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_count'], 5)
+        self.assertEqual(response.data['verified_count'], 3)
+        self.assertEqual(response.data['eligible_count'], 3)
+        seen.extend(p['id'] for p in response.data['participants'])
+
+        while response.data['has_more']:
+            response = self.client.get(
+                '/api/admin/participants/',
+                {'page_size': 2, 'cursor': response.data['next_cursor']}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('total_count', response.data)  # Contadores solo en la primera página
+            seen.extend(p['id'] for p in response.data['participants'])
+
+        expected = list(
+            Participant.objects.order_by('-registered_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/admin/participants/', {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_streaming_export_formats(self):
+        response = self.client.get('/api/admin/participants/export/', {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'name', 'email'])
+        self.assertEqual(len(lines), 6)
+
+        response = self.client.get('/api/admin/participants/export/', {'format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(
+            {row['verification_status'] for row in rows},
+            {'Email pendiente', 'Contraseña pendiente'}
+        )
+
+    def test_csv_export_neutralizes_formulas(self):
+        user = CustomUser.objects.create(
+            username='f@test.com', email='f@test.com', first_name='=HYPERLINK("http://x")', last_name='', phone='+5215550000'
+        )
+        Participant.objects.create(user=user, contest=self.contest)
+        response = self.client.get('/api/admin/participants/export/', {'format': 'csv'})
+        row = next(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertTrue(row['name'].startswith("'=HYPERLINK"))
+        self.assertEqual(row['phone'], "'+5215550000")
+
+        # NDJSON no pasa por una hoja de cálculo: los valores van sin cambios
+        response = self.client.get('/api/admin/participants/export/', {'format': 'ndjson'})
+        first = json.loads(b''.join(response.streaming_content).decode().splitlines()[0])
+        self.assertEqual(first['phone'], '+5215550000')
+
+    def test_export_requires_token(self):
+        response = APIClient().get('/api/admin/participants/export/')
+        self.assertEqual(response.status_code, 401)
+
+
+class JWTAdminAuthenticationTests(AdminAPITestCase):
+    """Autenticación unificada: un solo decode y una sola carga de usuario"""
+
+    def test_token_is_decoded_once_per_request(self):
+        with mock.patch.object(JWTService, 'decode_token', wraps=JWTService.decode_token) as decode:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get('/api/admin/participants/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(decode.call_count, 1)
+        user_queries = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT "emailer_customuser"')]
+        self.assertEqual(len(user_queries), 1)
+
+    def test_admin_user_is_cached_until_it_changes(self):
+        self.client.get('/api/admin/verify-token/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/admin/verify-token/').status_code, 200)
+
+        # post_save invalida la caché: el cambio se aplica en la siguiente request
+        self.admin.is_staff = False
+        self.admin.save()
+        self.assertEqual(self.client.get('/api/admin/verify-token/').status_code, 403)
+
+    @override_settings(JWT_BLACKLIST_BACKEND='redis')
+    def test_blacklist_outage_returns_503(self):
+        with mock.patch.object(RedisBlacklistStore, 'contains', side_effect=ConnectionError('redis caído')):
+            response = self.client.get('/api/admin/participants/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['code'], 'AUTH_UNAVAILABLE')
+
+    def test_logged_out_token_is_rejected(self):
+        self.assertEqual(self.client.post('/api/admin/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/admin/verify-token/').status_code, 401)
+        self.assertEqual(self.client.get('/api/admin/participants/').status_code, 401)
+
+
+@override_settings(JWT_BLACKLIST_BACKEND='memory', JWT_BLACKLIST_LOCAL_CACHE_SECONDS=60)
+class TokenBlacklistServiceTests(TestCase):
+    """Lista negra con TTL ligado al exp del token y caché negativa local"""
+
+    def test_blacklist_entry_lives_until_token_expiry(self):
+        store = get_blacklist_store()
+        with mock.patch.object(store, 'add', wraps=store.add) as add:
+            TokenBlacklistService.blacklist_payload({'jti': 'abc', 'exp': time.time() + 120})
+        ttl = add.call_args.args[1]
+        self.assertTrue(100 < ttl <= 120)
+        self.assertTrue(TokenBlacklistService.is_jti_blacklisted('abc'))
+
+    def test_negative_lookups_are_served_locally(self):
+        store = get_blacklist_store()
+        with mock.patch.object(store, 'contains', wraps=store.contains) as contains:
+            self.assertFalse(TokenBlacklistService.is_jti_blacklisted('xyz'))
+            self.assertFalse(TokenBlacklistService.is_jti_blacklisted('xyz'))
+        self.assertEqual(contains.call_count, 1)
+
+        # Un logout en este proceso invalida la entrada de la caché
+        TokenBlacklistService.blacklist_payload({'jti': 'xyz', 'exp': time.time() + 60})
+        self.assertTrue(TokenBlacklistService.is_jti_blacklisted('xyz'))
+
+
+    @override_settings(JWT_BLACKLIST_BACKEND='redis')
+    def test_logout_during_redis_outage_survives_recovery(self):
+        store = get_blacklist_store()
+        with mock.patch.object(store, 'add', side_effect=ConnectionError('redis caído')), \
+                mock.patch.object(store, 'contains', side_effect=ConnectionError('redis caído')):
+            TokenBlacklistService.blacklist_payload({'jti': 'caida', 'exp': time.time() + 60})
+            self.assertTrue(TokenBlacklistService.is_jti_blacklisted('caida'))
+
+        # Redis vuelve: la entrada local sigue vigente y se copia allí
+        with mock.patch.object(store, 'add') as add, \
+                mock.patch.object(store, 'contains', return_value=False):
+            self.assertTrue(TokenBlacklistService.is_jti_blacklisted('caida'))
+            self.assertFalse(TokenBlacklistService.is_jti_blacklisted('otro'))
+        self.assertEqual(add.call_args.args[0], 'caida')
+        self.assertTrue(50 < add.call_args.args[1] <= 60)
+
+    @override_settings(JWT_BLACKLIST_BACKEND='redis')
+    def test_redis_outage_fails_closed_unless_configured(self):
+        with mock.patch.object(RedisBlacklistStore, 'contains', side_effect=ConnectionError('redis caído')):
+            with self.assertRaises(BlacklistUnavailable):
+                TokenBlacklistService.is_jti_blacklisted('revocado-en-otro-worker')
+            with override_settings(JWT_BLACKLIST_FAIL_OPEN=True):
+                self.assertFalse(TokenBlacklistService.is_jti_blacklisted('revocado-en-otro-worker'))
+
+    def test_expired_entries_are_pruned_without_lookups(self):
+        store = InMemoryBlacklistStore()
+        for i in range(store.prune_every - 1):
+            store.add(f'viejo-{i}', 0)
+        store.add('vigente', 60)
+        self.assertEqual(len(store._entries), 1)
+
+class AdminContestStatsTests(AdminAPITestCase):
+    """Estadísticas agregadas del concurso activo"""
+
+    def test_stats_come_from_a_single_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/admin/contest-stats/')
+        self.assertEqual(response.status_code, 200)
+        participant_queries = [q for q in ctx.captured_queries if 'emailer_participant' in q['sql']]
+        self.assertEqual(len(participant_queries), 1)
+        self.assertEqual(response.data['total_count'], 5)
+        self.assertEqual(response.data['verified_count'], 3)
+        self.assertEqual(response.data['eligible_count'], 3)
+        # Los estados coinciden con los de la lista de participantes y suman el total
+        listed = Counter(p['verification_status'] for p in self.client.get('/api/admin/participants/').data['participants'])
+        self.assertEqual(response.data['verification_status'], {
+            'Email pendiente': 2,
+            'Contraseña pendiente': 3,
+            'No elegible': 0,
+            'Completamente verificado': 0,
+        })
+        self.assertEqual({k: v for k, v in response.data['verification_status'].items() if v}, dict(listed))
+        self.assertEqual(sum(response.data['verification_status'].values()), response.data['total_count'])
+
+    def test_counters_follow_registration_and_activation(self):
+        ContestStats.rebuild(self.contest.id)
+        client = APIClient()
+        response = client.post('/api/contest/register/', {
+            'email': 'nuevo@test.com', 'first_name': 'Nuevo', 'last_name': 'Test'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        verification = EmailVerification.objects.get(user__email='nuevo@test.com')
+        response = client.post('/api/verify-email/', {
+            'token': str(verification.token),
+            'password': 'ClaveSegura#2025',
+            'password_confirm': 'ClaveSegura#2025'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        stats = ContestStats.objects.get(contest=self.contest)
+        expected = ContestStats.compute(self.contest.id)
+        self.assertEqual({f: getattr(stats, f) for f in ContestStats.COUNTER_FIELDS}, expected)
+        self.assertEqual(stats.registered_count, 6)
+        self.assertEqual(stats.eligible_count, 4)
+        self.assertEqual(stats.fully_verified_count, 1)
+
+        # Borrar usuarios (cascada) o participantes también ajusta los contadores
+        CustomUser.objects.filter(email__in=['nuevo@test.com', 'user0@test.com']).delete()
+        Participant.objects.filter(user__email='user1@test.com').delete()
+        stats.refresh_from_db()
+        self.assertEqual({f: getattr(stats, f) for f in ContestStats.COUNTER_FIELDS}, ContestStats.compute(self.contest.id))
+        self.assertEqual(stats.registered_count, 3)
+
+
+@override_settings(CONTEST_ENFORCE_REGISTRATION_WINDOW=True)
+class ActiveContestResolverTests(TestCase):
+    """Concurso activo cacheado y ventana de fechas validada en memoria"""
+
+    def setUp(self):
+        cache.clear()
+        self.contest = Contest.objects.create(
+            name='Sorteo', description='Test',
+            start_date=timezone.now() - timezone.timedelta(days=30),
+            end_date=timezone.now() - timezone.timedelta(days=1)
+        )
+
+    def register(self, email):
+        return APIClient().post('/api/contest/register/', {
+            'email': email, 'first_name': 'Ana', 'last_name': 'Test'
+        }, format='json')
+
+    def test_registration_outside_window_is_rejected_without_queries(self):
+        self.assertEqual(get_active_contest(), self.contest)
+        with self.assertNumQueries(0):
+            response = self.register('tarde@test.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('finalizó', response.json()['message'])
+
+    def test_contest_save_invalidates_cache(self):
+        get_active_contest()
+        self.contest.end_date = timezone.now() + timezone.timedelta(days=1)
+        self.contest.save()
+        response = self.register('a-tiempo@test.com')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Participant.objects.get(user__email='a-tiempo@test.com').contest, self.contest)
+
+
+class DefaultContestTests(TestCase):
+    """Con la configuración por defecto el concurso creado automáticamente acepta registros"""
+
+    def test_registration_with_default_contest(self):
+        cache.clear()
+        self.assertFalse(settings.CONTEST_ENFORCE_REGISTRATION_WINDOW)
+        response = APIClient().post('/api/contest/register/', {
+            'email': 'defecto@test.com', 'first_name': 'Ana', 'last_name': 'Test'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        contest = Contest.objects.get(is_active=True)
+        self.assertEqual(contest.name, DEFAULT_CONTEST['name'])
+        self.assertLess(contest.end_date, timezone.now())  # Fechas del concurso original
+
+@override_settings(REGISTRATION_RECENT_EMAILS_SECONDS=0)
+class DuplicateEmailTests(TestCase):
+    """El duplicado lo detecta la restricción única, sin consulta previa"""
+
+    def setUp(self):
+        cache.clear()
+        Contest.objects.create(
+            name='Sorteo', description='Test',
+            start_date=timezone.now() - timezone.timedelta(days=1),
+            end_date=timezone.now() + timezone.timedelta(days=30)
+        )
+
+    def register(self, email):
+        return APIClient().post('/api/contest/register/', {
+            'email': email, 'first_name': 'Ana', 'last_name': 'Test'
+        }, format='json')
+
+    def test_registration_does_not_pre_check_email(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.register('nueva@test.com').status_code, 201)
+        user_selects = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and 'WHERE "emailer_customuser"."email"' in q['sql']
+        ]
+        self.assertEqual(user_selects, [])
+
+    def test_case_insensitive_duplicate_is_rejected_by_constraint(self):
+        self.assertEqual(self.register('Dup@Test.com').status_code, 201)
+        response = self.register('dup@test.COM')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'El correo electrónico ya está registrado.')
+        self.assertEqual(CustomUser.objects.filter(email__iexact='dup@test.com').count(), 1)
+
+    @override_settings(REGISTRATION_RECENT_EMAILS_SECONDS=60)
+    def test_recent_duplicate_is_rejected_without_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.register('rafaga@test.com').status_code, 201)
+        with self.assertNumQueries(0):
+            response = self.register('RAFAGA@test.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ya está registrado', response.json()['message'])
+
+    @override_settings(REGISTRATION_RECENT_EMAILS_SECONDS=60)
+    def test_deleted_user_can_register_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.register('borrada@test.com').status_code, 201)
+        CustomUser.objects.filter(email='borrada@test.com').delete()
+        self.assertEqual(self.register('borrada@test.com').status_code, 201)
+
+class AccountActivationTests(TestCase):
+    """El hash de la contraseña se calcula fuera de la transacción"""
+
+    def setUp(self):
+        cache.clear()
+        contest = Contest.objects.create(
+            name='Sorteo', description='Test',
+            start_date='2025-01-01T00:00:00Z', end_date='2025-02-14T23:59:59Z'
+        )
+        self.user = CustomUser.objects.create(username='act@test.com', email='act@test.com', password='')
+        Participant.objects.create(user=self.user, contest=contest)
+        self.verification = EmailVerification.objects.create(user=self.user)
+        self.data = {
+            'token': str(self.verification.token),
+            'password': 'ClaveSegura#2025',
+            'password_confirm': 'ClaveSegura#2025'
+        }
+
+    def assertActivated(self):
+        self.user.refresh_from_db()
+        self.verification.refresh_from_db()
+        self.assertTrue(self.user.check_password('ClaveSegura#2025'))
+        self.assertTrue(self.user.is_email_verified)
+        self.assertTrue(self.verification.is_used)
+        self.assertTrue(Participant.objects.get(user=self.user).is_eligible)
+
+    def test_password_is_hashed_before_the_transaction(self):
+        from .hashing import hash_password
+        outer_depth = len(connection.atomic_blocks)  # Transacciones propias del TestCase
+        depths = []
+
+        def tracking_hash(raw_password):
+            depths.append(len(connection.atomic_blocks))
+            return hash_password(raw_password)
+
+        with mock.patch('emailer.views.hash_password', side_effect=tracking_hash):
+            response = APIClient().post('/api/verify-email/', self.data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(depths, [outer_depth])
+        self.assertActivated()
+
+    def test_async_view_activates_account_once(self):
+        response = self.client.post('/api/verify-email/async/', self.data, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        self.assertActivated()
+
+        response = self.client.post('/api/verify-email/async/', self.data, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('inválido', response.json()['message'])
+
+    def test_activation_runs_a_fixed_number_of_statements(self):
+        ContestStats.rebuild(Participant.objects.get(user=self.user).contest_id)
+        with CaptureQueriesContext(connection) as ctx:
+            response = APIClient().post('/api/verify-email/', self.data, format='json')
+        self.assertEqual(response.status_code, 200)
+        statements = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        # Validación previa + SELECT con joins + UPDATE de usuario, token, participante y contadores
+        self.assertEqual(len(statements), 6, '\n'.join(statements))
+        self.assertEqual(sum(sql.startswith('UPDATE') for sql in statements), 4)
+        self.assertActivated()
+
+    def test_token_validity_is_cached_until_the_token_is_used(self):
+        url = f'/api/verify-token/{self.verification.token}/'
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['user_email'], 'act@test.com')
+
+        self.client.post('/api/verify-email/async/', self.data, content_type='application/json')
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+@override_settings(EMAIL_VERIFICATION_SIGNED_LINKS=True)
+class SignedVerificationLinkTests(AccountActivationTests):
+    """Enlaces firmados: se validan sin consultar la base y siguen siendo de un solo uso"""
+
+    def setUp(self):
+        super().setUp()
+        self.signed_token = make_verification_token(self.verification)
+        self.data['token'] = self.signed_token
+
+    def test_valid_and_forged_links_are_checked_without_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/verify-token/{self.signed_token}/')
+            forged = self.client.get(f'/api/verify-token/{self.signed_token[:-2]}xx/')
+            garbage = self.client.get('/api/verify-token/no-es-un-token/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('user_email', response.json())
+        # Firmado pero no cifrado: el token no debe exponer datos personales
+        self.assertNotIn('act@test.com', str(signing.loads(self.signed_token, salt=SIGNED_TOKEN_SALT)))
+        self.assertEqual(forged.status_code, 400)
+        self.assertEqual(garbage.status_code, 400)
+
+    def test_expired_link_is_rejected(self):
+        self.verification.expires_at = timezone.now() - timezone.timedelta(minutes=1)
+        expired_token = make_verification_token(self.verification)
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/verify-token/{expired_token}/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('expirado', response.json()['message'])
+
+class AdminSelectWinnerTests(AdminAPITestCase):
+    """Sorteo del ganador sin materializar el conjunto elegible"""
+
+    def setUp(self):
+        super().setUp()
+        self.eligible_ids = set()
+        for participant in Participant.objects.filter(is_eligible=True).select_related('user'):
+            participant.user.set_password('ClaveSegura#2025')
+            participant.user.save()
+            self.eligible_ids.add(participant.user_id)
+
+    def test_winner_is_drawn_among_eligible_participants(self):
+        eligible_ids = self.eligible_ids
+
+        with mock.patch('emailer.views.send_winner_notification_email'):
+            response = self.client.post('/api/admin/select-winner/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.data['winner']['id'], eligible_ids)
+        self.assertEqual(response.data['contest']['total_eligible'], len(eligible_ids))
+        self.contest.refresh_from_db()
+        self.assertIn(self.contest.winner_id, eligible_ids)
+
+    def test_multi_winner_draw_stores_ranked_results(self):
+        with mock.patch('emailer.views.send_winner_notification_email'):
+            response = self.client.post('/api/admin/draws/', {'winners': 2, 'alternates': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['winners']), 2)
+        self.assertEqual(len(response.data['alternates']), 1)
+        drawn = {p['id'] for p in response.data['winners'] + response.data['alternates']}
+        self.assertEqual(drawn, self.eligible_ids)
+
+        draw = ContestDraw.objects.get(id=response.data['draw']['id'])
+        self.assertEqual(draw.total_eligible, 3)
+        self.assertEqual(
+            list(draw.results.values_list('role', 'position')),
+            [('alternate', 1), ('winner', 1), ('winner', 2)]
+        )
+
+    def test_redraw_requires_flag_and_reason(self):
+        with mock.patch('emailer.views.send_winner_notification_email'):
+            self.assertEqual(self.client.post('/api/admin/draws/', {}, format='json').status_code, 200)
+            response = self.client.post('/api/admin/draws/', {}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Ya se realizó un sorteo', response.data['message'])
+            response = self.client.post('/api/admin/draws/', {'redraw': True}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('reason', response.data['field_errors'])
+            response = self.client.post(
+                '/api/admin/draws/', {'redraw': True, 'reason': 'Ganador no localizable'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ContestDraw.objects.count(), 2)
+        self.assertEqual(ContestDraw.objects.latest('id').redraw_reason, 'Ganador no localizable')
+
+    def test_participant_deleted_after_draw_is_skipped(self):
+        in_bulk = QuerySet.in_bulk
+
+        def delete_one_then_load(queryset, id_list, **kwargs):
+            Participant.objects.filter(id=id_list[0]).delete()
+            return in_bulk(queryset, id_list, **kwargs)
+
+        with mock.patch('emailer.views.send_winner_notification_email'), \
+                mock.patch.object(QuerySet, 'in_bulk', delete_one_then_load):
+            response = self.client.post('/api/admin/draws/', {'winners': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['winners']), 2)
+
+
+class ReservoirSampleTests(TestCase):
+    """Muestreo por reservorio en una sola pasada"""
+
+    def test_sample_is_bounded_and_without_repetition(self):
+        sample = reservoir_sample(((i, 1) for i in range(10000)), 5)
+        self.assertEqual(len(sample), 5)
+        self.assertEqual(len(set(sample)), 5)
+
+    def test_weighted_sample_skips_zero_weights(self):
+        items = [(1, 0), (2, 3), (3, 0), (4, 1)]
+        self.assertEqual(set(reservoir_sample(items, 4, weighted=True)), {2, 4})
+
+
+class EmailVerificationPurgeTests(TestCase):
+    """Limpieza en lotes de tokens usados o expirados"""
+
+    def test_purge_deletes_used_and_expired_tokens_in_batches(self):
+        user = CustomUser.objects.create(username='t@test.com', email='t@test.com')
+        past = timezone.now() - timezone.timedelta(hours=1)
+        valid = EmailVerification.objects.create(user=user)
+        for _ in range(3):
+            EmailVerification.objects.create(user=user, is_used=True)
+            EmailVerification.objects.create(user=user, expires_at=past)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(EmailVerification.purge_stale(batch_size=4), 6)
+        deletes = [q for q in ctx.captured_queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 2)
+        self.assertEqual(list(EmailVerification.objects.all()), [valid])
+
+class EmailOutboxTests(TestCase):
+    """El registro escribe en el outbox; el relay envía después del commit"""
+
+    def setUp(self):
+        cache.clear()
+        Contest.objects.create(
+            name='Sorteo', description='Test',
+            start_date=timezone.now() - timezone.timedelta(days=1),
+            end_date=timezone.now() + timezone.timedelta(days=30)
+        )
+
+    def test_registration_does_not_touch_broker(self):
+        with mock.patch('emailer.tasks.send_verification_email.delay') as delay:
+            response = APIClient().post('/api/contest/register/', {
+                'email': 'outbox@test.com', 'first_name': 'Out', 'last_name': 'Box'
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        delay.assert_not_called()
+
+        message = EmailOutbox.objects.get()
+        self.assertEqual(message.status, EmailOutbox.STATUS_PENDING)
+
+        self.assertEqual(relay_outbox(publish=False), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual(message.status, EmailOutbox.STATUS_SENT)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['outbox@test.com'])
+
+    def test_batch_delivery_reuses_one_connection(self):
+        for i in range(5):
+            user = CustomUser.objects.create(username=f'b{i}@test.com', email=f'b{i}@test.com', first_name='B')
+            enqueue_email(EmailOutbox.KIND_VERIFICATION, user.email, f'token-{i}')
+        enqueue_email(EmailOutbox.KIND_VERIFICATION, 'fantasma@test.com', 'token')
+
+        with mock.patch('emailer.mailer.get_connection', wraps=get_connection) as connections:
+            self.assertEqual(relay_outbox(publish=False), (5, 1))
+        self.assertEqual(connections.call_count, 1)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailOutbox.STATUS_SENT).count(), 5)
+        self.assertIn('no encontrado', EmailOutbox.objects.get(status=EmailOutbox.STATUS_PENDING).last_error)
+
+    def test_smtp_send_runs_outside_any_transaction(self):
+        user = CustomUser.objects.create(username='t@test.com', email='t@test.com', first_name='T')
+        enqueue_email(EmailOutbox.KIND_VERIFICATION, verification_payload(user, 'token'))
+        depth = len(connection.atomic_blocks)
+        statuses = []
+
+        def send(messages):
+            # Durante el envío no hay transacción abierta y la fila ya está reclamada
+            self.assertEqual(len(connection.atomic_blocks), depth)
+            statuses.append(EmailOutbox.objects.get().status)
+            return [None] * len(messages)
+
+        with mock.patch('emailer.mailer.send_messages_bulk', side_effect=send):
+            self.assertEqual(relay_outbox(publish=False), (1, 0))
+        self.assertEqual(statuses, [EmailOutbox.STATUS_SENDING])
+        self.assertEqual(EmailOutbox.objects.get().status, EmailOutbox.STATUS_SENT)
+
+    def test_claimed_messages_are_not_taken_by_another_relay(self):
+        user = CustomUser.objects.create(username='c@test.com', email='c@test.com', first_name='C')
+        enqueue_email(EmailOutbox.KIND_VERIFICATION, verification_payload(user, 'token'))
+        now = timezone.now()
+        self.assertEqual(len(_claim_batch(10, now)), 1)
+
+        # Un segundo relay en paralelo no encuentra nada que reclamar
+        self.assertEqual(_claim_batch(10, now), [])
+        self.assertEqual(relay_outbox(publish=False), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Si el primer relay muere, el mensaje se retoma al vencer la reserva
+        later = now + timezone.timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_SECONDS + 1)
+        with mock.patch('emailer.outbox.timezone.now', return_value=later):
+            self.assertEqual(relay_outbox(publish=False), (1, 0))
+        self.assertEqual(EmailOutbox.objects.get().attempts, 2)
+
+    def test_relay_task_runs_one_instance_at_a_time(self):
+        enqueue_email(EmailOutbox.KIND_VERIFICATION, 'x@test.com', 'token')
+        cache.add(OUTBOX_RELAY_LOCK_KEY, True)
+        with mock.patch('emailer.outbox.relay_outbox') as relay:
+            relay_email_outbox()
+        relay.assert_not_called()
+
+    def test_permanent_smtp_error_is_dead_lettered_at_once(self):
+        user = CustomUser.objects.create(username='p@test.com', email='p@test.com', first_name='P')
+        payload = verification_payload(user, 'token')
+        enqueue_email(EmailOutbox.KIND_VERIFICATION, payload)
+        enqueue_email(EmailOutbox.KIND_VERIFICATION, payload)
+        errors = [
+            smtplib.SMTPRecipientsRefused({'p@test.com': (550, b'no existe')}),
+            smtplib.SMTPServerDisconnected('421 intente más tarde'),
+        ]
+        with mock.patch('emailer.mailer.send_messages_bulk', return_value=errors):
+            self.assertEqual(relay_outbox(publish=False), (0, 2))
+
+        rejected, disconnected = EmailOutbox.objects.order_by('id')
+        self.assertEqual(rejected.status, EmailOutbox.STATUS_FAILED)
+        self.assertEqual(disconnected.status, EmailOutbox.STATUS_PENDING)
+        letter = EmailDeadLetter.objects.get()
+        self.assertEqual(letter.task_name, 'emailer.tasks.send_verification_email')
+        self.assertEqual(letter.args, [payload])
+        self.assertIn('550', letter.error)
+
+        with mock.patch('emailer.tasks.send_verification_email.apply_async') as apply_async:
+            call_command('replay_dead_letters', stdout=io.StringIO())
+        apply_async.assert_called_once_with([payload], {})
+
+    @override_settings(BROKER_BREAKER_FAILURE_THRESHOLD=3)  # Circuito propio del test
+    def test_failed_publish_is_retried_later(self):
+        enqueue_email(EmailOutbox.KIND_VERIFICATION, 'x@test.com', 'token')
+        with mock.patch('emailer.tasks.send_verification_email.apply_async', side_effect=ConnectionError('broker caído')):
+            self.assertEqual(relay_outbox(publish=True), (0, 1))
+        message = EmailOutbox.objects.get()
+        self.assertEqual(message.status, EmailOutbox.STATUS_PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.available_at, message.created_at)
+
+
+class EmailPayloadTests(TestCase):
+    """Las tareas reciben todo lo necesario en el payload"""
+
+    def test_payload_send_runs_no_queries(self):
+        user = CustomUser.objects.create(username='p@test.com', email='p@test.com', first_name='Pia')
+        payload = verification_payload(user, 'abc')
+
+        with self.assertNumQueries(0):
+            result = send_verification_email(payload)
+        self.assertIn('exitosamente', result)
+        self.assertEqual(mail.outbox[0].to, ['p@test.com'])
+        self.assertIn('/verify-email/abc', mail.outbox[0].body)
+
+    def test_legacy_arguments_are_still_accepted(self):
+        CustomUser.objects.create(username='l@test.com', email='l@test.com', first_name='Leo')
+        self.assertIn('exitosamente', send_verification_email('l@test.com', 'abc'))
+        self.assertIn('no soportada', send_verification_email({'v': 99}))
+
+class EmailRetryTests(TestCase):
+    """Errores transitorios de SMTP: reintentos y cola de mensajes muertos"""
+
+    def setUp(self):
+        user = CustomUser.objects.create(username='r@test.com', email='r@test.com', first_name='Rui')
+        self.payload = verification_payload(user, 'abc')
+
+    def test_transient_error_is_retried_then_sent(self):
+        error = smtplib.SMTPServerDisconnected('421 intente más tarde')
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=[error, 1]) as send, \
+                mock.patch.object(send_verification_email, 'retry', wraps=send_verification_email.retry) as retry:
+            send_verification_email.apply(args=[self.payload], throw=False)
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(retry.call_count, 1)
+        self.assertFalse(EmailDeadLetter.objects.exists())
+
+    def test_permanent_errors_go_to_dead_letter_without_retrying(self):
+        errors = [
+            smtplib.SMTPRecipientsRefused({'r@test.com': (550, b'no existe')}),
+            smtplib.SMTPResponseException(554, b'rechazado'),
+        ]
+        for error in errors:
+            with mock.patch('django.core.mail.EmailMessage.send', side_effect=error) as send:
+                send_verification_email.apply(args=[self.payload], throw=False)
+            self.assertEqual(send.call_count, 1)
+        self.assertEqual(list(EmailDeadLetter.objects.values_list('retries', flat=True)), [0, 0])
+
+    def test_4xx_response_is_retried(self):
+        error = smtplib.SMTPResponseException(451, b'intente mas tarde')
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=[error, 1]) as send:
+            send_verification_email.apply(args=[self.payload], throw=False)
+        self.assertEqual(send.call_count, 2)
+        self.assertFalse(EmailDeadLetter.objects.exists())
+
+    def test_exhausted_retries_go_to_dead_letter_and_can_be_replayed(self):
+        error = smtplib.SMTPServerDisconnected('421 intente más tarde')
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=error):
+            # Último intento: el worker ya agotó los reintentos
+            send_verification_email.apply(
+                args=[self.payload], retries=send_verification_email.max_retries, throw=False
+            )
+
+        letter = EmailDeadLetter.objects.get()
+        self.assertEqual(letter.task_name, 'emailer.tasks.send_verification_email')
+        self.assertEqual(letter.args, [self.payload])
+        self.assertIn('421', letter.error)
+
+        with mock.patch('emailer.tasks.send_verification_email.apply_async') as apply_async:
+            call_command('replay_dead_letters', stdout=io.StringIO())
+        apply_async.assert_called_once_with([self.payload], {})
+        letter.refresh_from_db()
+        self.assertIsNotNone(letter.replayed_at)
+
+@override_settings(BROKER_BREAKER_FAILURE_THRESHOLD=2, BROKER_BREAKER_RESET_SECONDS=60)
+class BrokerCircuitBreakerTests(TestCase):
+    """Con el broker caído se publica rápido o se usa el outbox"""
+
+    def test_open_breaker_spools_to_outbox_without_calling_broker(self):
+        payload = winner_payload(CustomUser(email='w@test.com', first_name='Wen'), Contest(name='Sorteo Test'))
+
+        with mock.patch.object(send_winner_notification_email, 'apply_async', side_effect=ConnectionError('redis caído')) as apply_async:
+            for _ in range(3):
+                self.assertFalse(publish_or_spool(send_winner_notification_email, EmailOutbox.KIND_WINNER, payload))
+        self.assertEqual(apply_async.call_count, 2)
+        self.assertEqual(EmailOutbox.objects.filter(kind=EmailOutbox.KIND_WINNER).count(), 3)
+
+        # El relay no publica mientras el circuito está abierto, pero sí puede enviar por SMTP
+        self.assertEqual(relay_outbox(publish=True), (0, 0))
+        self.assertEqual(relay_outbox(publish=False), (3, 0))
+        self.assertIn('Sorteo Test', mail.outbox[0].subject)
+
+    def test_half_open_breaker_allows_a_single_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+        breaker.record_failure()
+        breaker.before_call()  # Prueba permitida
+        with self.assertRaises(BrokerUnavailable):
+            breaker.before_call()
+        breaker.record_success()
+        breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_publish_to_unreachable_broker_fails_fast(self):
+        from backend.celery import app
+
+        # Puerto local sin servidor: la conexión se rechaza al instante
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            closed_url = f"redis://127.0.0.1:{sock.getsockname()[1]}/0"
+
+        with mock.patch.dict(os.environ, CELERY_BROKER_URL=closed_url), \
+                override_settings(CELERY_BROKER_URL=closed_url):
+            app._pool = app.amqp._producer_pool = None
+            try:
+                started = time.perf_counter()
+                with self.assertRaises(BrokerUnavailable):
+                    publish_task(send_winner_notification_email, {})
+                elapsed = time.perf_counter() - started
+            finally:
+                app._pool = app.amqp._producer_pool = None
+        self.assertLess(elapsed, 1)
+
+class FakeSMTPConnection:
+    """Conexión SMTP simulada: tarda un poco y rechaza a rechazado@test.com"""
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def __init__(self, **kwargs):
+        self.connection = None
+
+    def open(self):
+        self.connection = self.connection or object()
+
+    def close(self):
+        self.connection = None
+
+    def send_messages(self, messages):
+        cls = FakeSMTPConnection
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        time.sleep(0.01)
+        with cls.lock:
+            cls.active -= 1
+        if messages[0].to == ['rechazado@test.com']:
+            raise smtplib.SMTPRecipientsRefused({'rechazado@test.com': (550, b'no existe')})
+        return 1
+
+
+@mock.patch('emailer.backends.SMTPEmailBackend', FakeSMTPConnection)
+class AsyncSMTPEmailBackendTests(TestCase):
+    """Envío concurrente con un número acotado de conexiones"""
+
+    def setUp(self):
+        FakeSMTPConnection.max_active = 0
+        self.messages = [mail.EmailMessage('s', 'b', 'a@test.com', [f'u{i}@test.com']) for i in range(12)]
+
+    def test_sends_concurrently_up_to_the_limit(self):
+        backend = AsyncSMTPEmailBackend(concurrency=4)
+        self.assertEqual(backend.send_messages(self.messages), 12)
+        self.assertEqual(FakeSMTPConnection.max_active, 4)
+
+    def test_open_backend_reuses_its_thread_pool(self):
+        with mock.patch('emailer.backends.ThreadPoolExecutor', wraps=ThreadPoolExecutor) as executors:
+            with AsyncSMTPEmailBackend(concurrency=4) as backend:
+                self.assertEqual(backend.send_messages(self.messages[:6]), 6)
+                self.assertEqual(backend.send_messages(self.messages[6:]), 6)
+            # Un solo mensaje (email.send() en una tarea) no crea pool
+            self.assertEqual(AsyncSMTPEmailBackend(concurrency=4).send_messages(self.messages[:1]), 1)
+        self.assertEqual(executors.call_count, 1)
+
+    def test_reports_errors_per_message(self):
+        self.messages[3].to = ['rechazado@test.com']
+        with override_settings(EMAIL_BACKEND='emailer.backends.AsyncSMTPEmailBackend'):
+            results = send_messages_bulk(self.messages, batch_size=20)
+        self.assertEqual(len(results), 12)
+        self.assertIsInstance(results[3], smtplib.SMTPRecipientsRefused)
+        self.assertIn('rechazado@test.com', str(results[3]))
+        self.assertEqual([r for i, r in enumerate(results) if i != 3], [None] * 11)
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            AsyncSMTPEmailBackend(concurrency=4).send_messages(self.messages)
+
+class EmailPipelineBenchmarkTests(TestCase):
+    """El benchmark envía contra el servidor SMTP local y reporta métricas"""
+
+    def test_eager_benchmark_reports_throughput_and_latency(self):
+        out = io.StringIO()
+        call_command('benchmark_email_pipeline', count=5, mode='eager', json=True, stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual(results['eager']['sent'], 5)
+        self.assertGreater(results['eager']['messages_per_second'], 0)
+        self.assertLessEqual(results['eager']['p50_ms'], results['eager']['p99_ms'])
+        self.assertGreater(results['render_us'], 0)
+
+class CeleryRoutingTests(TestCase):
+    """Cada tipo de email va a su cola y no guarda resultado"""
+
+    def test_mail_tasks_are_routed_to_dedicated_queues(self):
+        from backend.celery import app
+        router = app.amqp.router
+        winner = router.route({}, 'emailer.tasks.send_winner_notification_email')
+        verification = router.route({}, 'emailer.tasks.send_verification_email')
+        self.assertEqual(winner['queue'].name, 'notifications')
+        self.assertEqual(verification['queue'].name, 'verification')
+        self.assertLess(winner['priority'], verification['priority'])
+        self.assertTrue(send_winner_notification_email.ignore_result)
+        self.assertTrue(send_verification_email.ignore_result)
+
+class EmailTemplateTests(TestCase):
+    """Plantillas de email precompiladas con CSS inline"""
+
+    def test_render_substitutes_and_escapes_recipient_fields(self):
+        text, html = render_email('verification', first_name='Ana & <Luis>', verification_url='http://x/abc')
+        self.assertIn('¡Hola Ana & <Luis>!', text)
+        self.assertIn('Ana &amp; &lt;Luis&gt;', html)
+        self.assertIn('href="http://x/abc"', html)
+        self.assertRegex(html, r'<div class="content" style="[^"]*padding: 30px;')
+        self.assertNotIn('__EMAIL_FIELD_', text + html)
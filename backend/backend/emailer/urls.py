@@ -5,7 +5,8 @@ urlpatterns = [
     # Contest routes (public)
     path('contest/register/', views.contest_register, name='contest_register'),
     path('verify-email/', views.verify_email_and_create_password, name='verify_email_create_password'),
-    path('verify-token/<uuid:token>/', views.verify_token_validity, name='verify_token_validity'),
+    path('verify-email/async/', views.verify_email_and_create_password_async, name='verify_email_create_password_async'),
+    path('verify-token/<str:token>/', views.verify_token_validity, name='verify_token_validity'),
     path('reset-database/', views.reset_database_for_testing, name='reset_database_testing'),  # ⚠️ SOLO DESARROLLO
     
     # Admin authentication routes
@@ -16,5 +17,8 @@ urlpatterns = [
     
     # Admin management routes (protected)
     path('admin/participants/', views.admin_participants_list, name='admin_participants_list'),
+    path('admin/participants/export/', views.admin_participants_export, name='admin_participants_export'),
+    path('admin/contest-stats/', views.admin_contest_stats, name='admin_contest_stats'),
     path('admin/select-winner/', views.admin_select_winner, name='admin_select_winner'),
+    path('admin/draws/', views.admin_draw_winners, name='admin_draw_winners'),
 ]
\ No newline at end of file
@@ -1,18 +1,42 @@
+import base64
+import binascii
+import csv
+import json
+import logging
+import random
+import uuid
+from datetime import datetime
+from itertools import chain
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework.decorators import authentication_classes, permission_classes
 from django.views.decorators.http import require_http_methods
-from .models import CustomUser, Contest, Participant, EmailVerification
-from .serializers import ContestRegistrationSerializer, PasswordCreationSerializer, AdminCreateSerializer, AdminLoginSerializer
-from .tasks import send_verification_email
+from .models import CustomUser, Contest, ContestDraw, ContestStats, DrawResult, EmailOutbox, Participant, EmailVerification
+from .serializers import ContestRegistrationSerializer, PasswordCreationSerializer, AdminCreateSerializer, AdminLoginSerializer, ContestDrawSerializer
+from .sampling import reservoir_sample
+from .signed_tokens import VerificationLinkError, make_verification_token, read_signed_token
+from .broker import publish_or_spool
+from .contests import get_active_contest, registration_window_error
+from .hashing import ahash_password, hash_password
+from .outbox import enqueue_email
+from .tasks import send_winner_notification_email, verification_payload, winner_payload
 from .jwt_utils import JWTService, TokenBlacklistService
+from .authentication import JWTAdminAuthentication, IsAdminJWTUser, JWTAuthError, authenticate_jwt_request, is_admin_user
+
+logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -21,6 +45,15 @@ def contest_register(request):
     Endpoint público para registrarse en el concurso.
     Valida que el email no esté duplicado y crea el usuario + participante.
     """
+    # Concurso activo desde la caché; fuera de fechas se rechaza sin tocar la base
+    contest = get_active_contest()
+    window_error = registration_window_error(contest)
+    if window_error:
+        return Response({
+            'success': False,
+            'message': window_error
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
     serializer = ContestRegistrationSerializer(data=request.data)
     
     if serializer.is_valid():
@@ -29,34 +62,21 @@ def contest_register(request):
                 # Crear el usuario
                 user = serializer.save()
                 
-                # Obtener o crear el concurso activo
-                contest, created = Contest.objects.get_or_create(
-                    is_active=True,
-                    defaults={
-                        'name': 'Sorteo San Valentín 2025',
-                        'description': 'Gana una estadía romántica de 2 noches para una pareja',
-                        'start_date': '2025-01-01T00:00:00Z',
-                        'end_date': '2025-02-14T23:59:59Z'
-                    }
-                )
-                
                 # Crear participante
                 participant = Participant.objects.create(
                     user=user,
                     contest=contest,
                     is_eligible=False  # Solo elegible después de verificar email
                 )
+                ContestStats.increment(contest.id, **ContestStats.participant_deltas(
+                    user.is_email_verified, bool(user.password), participant.is_eligible
+                ))
                 
                 # Crear token de verificación de email
                 verification = EmailVerification.objects.create(user=user)
                 
-                # Enviar email de verificación (tarea asíncrona)
-                try:
-                    send_verification_email.delay(user.email, str(verification.token))
-                except Exception as e:
-                    # Si Celery no está disponible, enviar de forma síncrona
-                    print(f"Celery no disponible, enviando email síncronamente: {e}")
-                    send_verification_email(user.email, str(verification.token))
+                # Registrar el email en el outbox (mismo commit); el relay lo envía después
+                enqueue_email(EmailOutbox.KIND_VERIFICATION, verification_payload(user, make_verification_token(verification)))
                 
                 return Response({
                     'success': True,
@@ -64,6 +84,13 @@ def contest_register(request):
                     'user_id': user.id
                 }, status=status.HTTP_201_CREATED)
                 
+        except ValidationError as e:
+            # Email duplicado detectado por la restricción única al insertar
+            return Response({
+                'success': False,
+                'message': 'El correo electrónico ya está registrado.',
+                'field_errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 'success': False,
@@ -93,6 +120,7 @@ def verify_email_and_create_password(request):
     """
     Endpoint para verificar el email y crear contraseña.
     Recibe token de verificación y nueva contraseña.
+    El hash de la contraseña se calcula antes de abrir la transacción.
     """
     serializer = PasswordCreationSerializer(data=request.data)
     
@@ -101,50 +129,13 @@ def verify_email_and_create_password(request):
         password = serializer.validated_data['password']
         
         try:
-            with transaction.atomic():
-                # Buscar el token de verificación
-                verification = EmailVerification.objects.get(
-                    token=token,
-                    is_used=False
-                )
-                
-                # Verificar que no haya expirado
-                if verification.is_expired():
-                    return Response({
-                        'success': False,
-                        'message': 'El enlace de verificación ha expirado.'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Obtener el usuario
-                user = verification.user
-                
-                # Establecer la contraseña y marcar como verificado
-                user.set_password(password)
-                user.is_email_verified = True
-                user.save()
-                
-                # Marcar el token como usado
-                verification.is_used = True
-                verification.save()
-                
-                # Marcar al participante como elegible
-                try:
-                    participant = Participant.objects.get(user=user)
-                    participant.is_eligible = True
-                    participant.save()
-                except Participant.DoesNotExist:
-                    pass  # No debería pasar, pero por si acaso
-                
-                return Response({
-                    'success': True,
-                    'message': 'Tu cuenta ha sido activada. Ya estás participando en el sorteo.'
-                }, status=status.HTTP_200_OK)
-                
-        except EmailVerification.DoesNotExist:
-            return Response({
-                'success': False,
-                'message': 'Token de verificación inválido o ya utilizado.'
-            }, status=status.HTTP_400_BAD_REQUEST)
+            # Validar el token antes de gastar CPU en el hash
+            error = _check_verification_token(EmailVerification.objects.filter(token=token, is_used=False).first())
+            if error:
+                return Response(*error)
+            
+            password_hash = hash_password(password)
+            return Response(*_activate_account(token, password_hash))
         except Exception as e:
             return Response({
                 'success': False,
@@ -158,35 +149,182 @@ def verify_email_and_create_password(request):
             'field_errors': serializer.errors
         }, status=status.HTTP_400_BAD_REQUEST)
 
+@csrf_exempt
+@require_http_methods(['POST'])
+async def verify_email_and_create_password_async(request):
+    """
+    Variante async de verify_email_and_create_password: el hash se espera con
+    await (sin ocupar el hilo de la request) y solo las escrituras finales
+    corren en la transacción.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'JSON inválido'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = PasswordCreationSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse({
+            'success': False,
+            'message': 'Error en los datos proporcionados',
+            'field_errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    token = serializer.validated_data['token']
+    try:
+        verification = await EmailVerification.objects.filter(token=token, is_used=False).afirst()
+        result = _check_verification_token(verification)
+        if result is None:
+            password_hash = await ahash_password(serializer.validated_data['password'])
+            result = await sync_to_async(_activate_account)(token, password_hash)
+        data, status_code = result
+        return JsonResponse(data, status=status_code)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': 'Error interno del servidor'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _check_verification_token(verification):
+    """Devuelve (datos, status) del error si el token no sirve, o None"""
+    if verification is None:
+        return {
+            'success': False,
+            'message': 'Token de verificación inválido o ya utilizado.'
+        }, status.HTTP_400_BAD_REQUEST
+    
+    if verification.is_expired():
+        return {
+            'success': False,
+            'message': 'El enlace de verificación ha expirado.'
+        }, status.HTTP_400_BAD_REQUEST
+    return None
+
+def _activate_account(token, password_hash):
+    """
+    Activa la cuenta con el hash ya calculado. La transacción solo contiene
+    un SELECT (verificación + usuario + participante) y UPDATEs de las
+    columnas que cambian. Devuelve (datos, status).
+    """
+    try:
+        with transaction.atomic():
+            # Volver a buscar el token bloqueando la fila: otra request pudo
+            # usarlo mientras se calculaba el hash
+            verification = (
+                EmailVerification.objects
+                .select_for_update(of=('self', 'user'))
+                .select_related('user__participant')
+                .get(token=token, is_used=False)
+            )
+            
+            user = verification.user
+            was_verified = user.is_email_verified
+            had_password = bool(user.password)
+            
+            # Establecer la contraseña y marcar como verificado
+            user.password = password_hash
+            user.is_email_verified = True
+            user.save(update_fields=['password', 'is_email_verified'])
+            
+            # Marcar el token como usado
+            EmailVerification.objects.filter(pk=verification.pk).update(is_used=True)
+            
+            # Marcar al participante como elegible
+            try:
+                participant = user.participant
+            except Participant.DoesNotExist:
+                participant = None  # No debería pasar, pero por si acaso
+            
+            if participant is not None:
+                was_eligible = participant.is_eligible
+                if not was_eligible:
+                    Participant.objects.filter(pk=participant.pk).update(is_eligible=True)
+                
+                # Actualizar contadores del concurso en la misma transacción
+                ContestStats.move(
+                    participant.contest_id,
+                    before=(was_verified, had_password, was_eligible),
+                    after=(True, True, True)
+                )
+    
+    except EmailVerification.DoesNotExist:
+        return {
+            'success': False,
+            'message': 'Token de verificación inválido o ya utilizado.'
+        }, status.HTTP_400_BAD_REQUEST
+    
+    # El token ya está usado (transacción confirmada): invalidar la respuesta cacheada
+    cache.delete(_token_validity_cache_key(token))
+    return {
+        'success': True,
+        'message': 'Tu cuenta ha sido activada. Ya estás participando en el sorteo.'
+    }, status.HTTP_200_OK
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def verify_token_validity(request, token):
     """
     Endpoint para verificar si un token es válido antes de mostrar el formulario.
+    Los enlaces firmados se validan sin consultar la base (el uso único se
+    comprueba al crear la contraseña).
     """
     try:
-        verification = EmailVerification.objects.get(
-            token=token,
-            is_used=False
-        )
-        
-        if verification.is_expired():
+        uuid.UUID(token)
+    except ValueError:
+        try:
+            read_signed_token(token)
+        except VerificationLinkError as e:
             return Response({
                 'valid': False,
-                'message': 'El enlace de verificación ha expirado.'
+                'message': e.message
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        # Sin datos personales: el enlace firmado no los lleva (ver make_verification_token)
         return Response({
-            'valid': True,
-            'user_email': verification.user.email,
-            'user_name': verification.user.get_full_name()
+            'valid': True
         }, status=status.HTTP_200_OK)
-        
-    except EmailVerification.DoesNotExist:
-        return Response({
+    
+    # La respuesta no cambia hasta que el token se usa o expira: se cachea por token
+    cache_key = _token_validity_cache_key(token)
+    cached = cache.get(cache_key)
+    if cached is None:
+        data, status_code, ttl = _lookup_token_validity(token)
+        cached = (data, status_code)
+        if ttl > 0:
+            cache.set(cache_key, cached, ttl)
+    return Response(*cached)
+
+def _token_validity_cache_key(token):
+    return f"verify-token:{uuid.UUID(str(token)).hex}"
+
+def _lookup_token_validity(token):
+    """Devuelve (datos, status, segundos de caché) sin pasar nunca de expires_at"""
+    verification = EmailVerification.objects.select_related('user').filter(
+        token=token,
+        is_used=False
+    ).first()
+    
+    if verification is None:
+        return {
             'valid': False,
             'message': 'Token de verificación inválido.'
-        }, status=status.HTTP_400_BAD_REQUEST)
+        }, status.HTTP_400_BAD_REQUEST, settings.VERIFY_TOKEN_CACHE_SECONDS
+    
+    if verification.is_expired():
+        return {
+            'valid': False,
+            'message': 'El enlace de verificación ha expirado.'
+        }, status.HTTP_400_BAD_REQUEST, settings.VERIFY_TOKEN_CACHE_SECONDS
+    
+    seconds_left = (verification.expires_at - timezone.now()).total_seconds()
+    return {
+        'valid': True,
+        'user_email': verification.user.email,
+        'user_name': verification.user.get_full_name()
+    }, status.HTTP_200_OK, int(min(settings.VERIFY_TOKEN_CACHE_SECONDS, seconds_left))
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -243,6 +381,12 @@ def admin_create(request):
                     'is_staff': admin_user.is_staff
                 }
             }, status=status.HTTP_201_CREATED)
+        except ValidationError as e:
+            return Response({
+                'success': False,
+                'message': 'Error en los datos proporcionados',
+                'field_errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 'success': False,
@@ -299,25 +443,16 @@ def admin_login(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
-@permission_classes([AllowAny])
+@authentication_classes([JWTAdminAuthentication])
+@permission_classes([IsAdminJWTUser])
 def admin_logout(request):
     """
     Endpoint para logout de administradores.
     Invalida el token JWT actual.
     """
-    auth_header = request.META.get('HTTP_AUTHORIZATION')
-    
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return Response({
-            'success': False,
-            'message': 'Token de autorización requerido'
-        }, status=status.HTTP_400_BAD_REQUEST)
-    
-    token = auth_header.split(' ')[1]
-    
     try:
-        # Agregar token a lista negra
-        if TokenBlacklistService.blacklist_token(token):
+        # Agregar token a lista negra (payload ya decodificado por la autenticación)
+        if TokenBlacklistService.blacklist_payload(request.auth):
             return Response({
                 'success': True,
                 'message': 'Logout exitoso'
@@ -335,206 +470,150 @@ def admin_logout(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
+@authentication_classes([JWTAdminAuthentication])
+@permission_classes([IsAdminJWTUser])
 def admin_verify_token(request):
     """
     Endpoint para verificar validez del token actual.
     Requiere autenticación.
     """
-    auth_header = request.META.get('HTTP_AUTHORIZATION')
-    
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return Response({
-            'valid': False,
-            'message': 'Token de autorización requerido'
-        }, status=status.HTTP_401_UNAUTHORIZED)
-    
-    token = auth_header.split(' ')[1]
+    # Token, lista negra y usuario ya validados por JWTAdminAuthentication
+    user = request.user
     
-    try:
-        # Verificar si el token está en lista negra
-        if TokenBlacklistService.is_token_blacklisted(token):
-            return Response({
-                'valid': False,
-                'message': 'Token invalidado'
-            }, status=status.HTTP_401_UNAUTHORIZED)
-        
-        # Verificar validez del token
-        user, error = JWTService.get_user_from_token(token)
-        
-        if error:
-            return Response({
-                'valid': False,
-                'message': error
-            }, status=status.HTTP_401_UNAUTHORIZED)
-        
-        return Response({
-            'valid': True,
-            'user': {
-                'id': user.id,
-                'email': user.email,
-                'name': user.get_full_name(),
-                'is_staff': user.is_staff
-            }
-        }, status=status.HTTP_200_OK)
-        
-    except Exception as e:
-        return Response({
-            'valid': False,
-            'message': 'Error verificando token'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)# ========== ADMIN AUTHENTICATION VIEWS ==========
+    return Response({
+        'valid': True,
+        'user': {
+            'id': user.id,
+            'email': user.email,
+            'name': user.get_full_name(),
+            'is_staff': user.is_staff
+        }
+    }, status=status.HTTP_200_OK)
+# ========== ADMIN AUTHENTICATION VIEWS ==========
 
 @api_view(['GET'])
+@authentication_classes([JWTAdminAuthentication])
+@permission_classes([IsAdminJWTUser])
 def admin_participants_list(request):
     """
     Endpoint protegido para obtener la lista de participantes del concurso.
     Requiere token JWT de administrador válido.
     """
-    from .decorators import jwt_required
-    
-    # Aplicar manualmente la validación JWT
-    auth_header = request.META.get('HTTP_AUTHORIZATION')
-    
-    print(f"DEBUG - Authorization header recibido: {auth_header}")
-    print(f"DEBUG - Headers completos: {dict(request.META)}")
-    
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return Response({
-            'success': False,
-            'message': 'Token de autorización requerido. Formato: Bearer <token>'
-        }, status=status.HTTP_401_UNAUTHORIZED)
-    
-    token = auth_header.split(' ')[1]
-    
-    print(f"DEBUG - Token extraído: {token}")
-    
     try:
-        # Decodificar el token
-        payload, error = JWTService.decode_token(token)
-        
-        print(f"DEBUG - Payload decodificado: {payload}")
-        print(f"DEBUG - Error de decodificación: {error}")
+        # Tamaño de página configurable (?page_size=N), acotado por settings
+        try:
+            page_size = int(request.query_params.get('page_size', settings.ADMIN_PARTICIPANTS_PAGE_SIZE))
+        except (TypeError, ValueError):
+            page_size = settings.ADMIN_PARTICIPANTS_PAGE_SIZE
+        page_size = max(1, min(page_size, settings.ADMIN_PARTICIPANTS_MAX_PAGE_SIZE))
         
-        if error or not payload:
-            return Response({
-                'success': False,
-                'message': f'Token inválido: {error or "Token no válido"}'
-            }, status=status.HTTP_401_UNAUTHORIZED)
+        # Proyección de columnas con JOIN a usuario (una sola consulta por página)
+        queryset = _participants_projection()
         
-        # Verificar que el usuario existe y es staff
-        try:
-            user = CustomUser.objects.get(
-                id=payload['user_id'], 
-                is_staff=True,
-                is_active=True
+        # Paginación por cursor (registered_at, id): sin OFFSET
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                cursor_date, cursor_id = _decode_participants_cursor(cursor)
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'message': 'Cursor de paginación inválido'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(
+                Q(registered_at__lt=cursor_date) |
+                Q(registered_at=cursor_date, id__lt=cursor_id)
             )
-        except CustomUser.DoesNotExist:
-            return Response({
-                'success': False,
-                'message': 'Usuario no encontrado o sin permisos de administrador'
-            }, status=status.HTTP_401_UNAUTHORIZED)
-            
+        
+        # Se pide un registro extra para saber si hay más páginas
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        
+        participants = [_serialize_participant_row(row) for row in rows]
+        
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = _encode_participants_cursor(last['registered_at'], last['id'])
+        
+        data = {
+            'success': True,
+            'participants': participants,
+            'page_size': page_size,
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }
+        
+        # Contadores globales (una consulta agregada) solo en la primera página;
+        # las siguientes páginas del cursor no repiten el recorrido de la tabla
+        if not cursor:
+            counts = _get_participant_stats(Participant.objects.all())
+            data['total_count'] = counts['total_count']
+            data['verified_count'] = counts['verified_count']
+            data['eligible_count'] = counts['eligible_count']
+        
+        return Response(data, status=status.HTTP_200_OK)
+        
     except Exception as e:
         return Response({
             'success': False,
-            'message': f'Token inválido o expirado: {str(e)}'
-        }, status=status.HTTP_401_UNAUTHORIZED)
-    
-    # Si llegamos aquí, el token es válido
+            'message': f'Error al obtener la lista de participantes: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@authentication_classes([JWTAdminAuthentication])
+@permission_classes([IsAdminJWTUser])
+def admin_contest_stats(request):
+    """
+    Endpoint protegido con las estadísticas del concurso activo.
+    Los contadores se leen de ContestStats (mantenidos de forma incremental).
+    """
     try:
-        # Obtener todos los participantes con información completa
-        participants = []
+        # Lectura por clave primaria de los contadores incrementales
+        contest = Contest.objects.select_related('stats').filter(is_active=True).first()
+        if not contest:
+            return Response({
+                'success': False,
+                'message': 'No hay concursos activos disponibles'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        for participant in Participant.objects.all().order_by('-registered_at'):
-            # Obtener información del usuario relacionado
-            user = participant.user
-            
-            # Verificar si el email está verificado
-            is_email_verified = user.is_email_verified
-            
-            # Obtener información adicional
-            participant_data = {
-                'id': participant.id,
-                'name': f"{user.first_name} {user.last_name}".strip() or 'Sin nombre',
-                'email': user.email,
-                'phone': user.phone or 'No especificado',
-                'is_eligible': participant.is_eligible,
-                'is_email_verified': is_email_verified,
-                'has_password': bool(user.password),  # Indica si completó el registro
-                'registration_date': participant.registered_at.isoformat(),
-                'verification_status': _get_verification_status(user, participant)
-            }
-            
-            participants.append(participant_data)
+        try:
+            stats = contest.stats
+        except ContestStats.DoesNotExist:
+            stats = ContestStats.rebuild(contest.id)
         
         return Response({
             'success': True,
-            'participants': participants,
-            'total_count': len(participants),
-            'verified_count': len([p for p in participants if p['is_email_verified']]),
-            'eligible_count': len([p for p in participants if p['is_eligible']])
+            'contest': {
+                'id': contest.id,
+                'name': contest.name,
+                'has_winner': contest.winner_id is not None
+            },
+            **stats.as_dict()
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response({
             'success': False,
-            'message': f'Error al obtener la lista de participantes: {str(e)}'
+            'message': f'Error al obtener estadísticas del concurso: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @csrf_exempt
 @api_view(['POST'])
-@authentication_classes([])
-@permission_classes([AllowAny])
+@authentication_classes([JWTAdminAuthentication])
+@permission_classes([IsAdminJWTUser])
 def admin_select_winner(request):
     """
     Endpoint protegido para seleccionar un ganador aleatorio del concurso.
     Requiere token JWT de administrador válido.
     """
-    import random
-    
-    # Validar token JWT
-    auth_header = request.META.get('HTTP_AUTHORIZATION')
-    
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return Response({
-            'success': False,
-            'message': 'Token de autorización requerido. Formato: Bearer <token>'
-        }, status=status.HTTP_401_UNAUTHORIZED)
-    
-    token = auth_header.split(' ')[1]
-    
-    try:
-        # Decodificar el token
-        payload, error = JWTService.decode_token(token)
-        
-        if error or not payload:
-            return Response({
-                'success': False,
-                'message': f'Token inválido: {error or "Token no válido"}'
-            }, status=status.HTTP_401_UNAUTHORIZED)
-        
-        # Verificar que el usuario existe y es staff
-        try:
-            admin_user = CustomUser.objects.get(
-                id=payload['user_id'], 
-                is_staff=True,
-                is_active=True
-            )
-        except CustomUser.DoesNotExist:
-            return Response({
-                'success': False,
-                'message': 'Usuario no encontrado o sin permisos de administrador'
-            }, status=status.HTTP_401_UNAUTHORIZED)
-            
-    except Exception as e:
-        return Response({
-            'success': False,
-            'message': f'Token inválido o expirado: {str(e)}'
-        }, status=status.HTTP_401_UNAUTHORIZED)
+    # Token validado por JWTAdminAuthentication
+    admin_user = request.user
     
-    # Si llegamos aquí, el token es válido
     try:
-        # Obtener el concurso activo
-        contest = Contest.objects.filter(is_active=True).first()
+        # Obtener el concurso activo (con el ganador en la misma consulta)
+        contest = Contest.objects.select_related('winner').filter(is_active=True).first()
         if not contest:
             return Response({
                 'success': False,
@@ -561,31 +640,28 @@ def admin_select_winner(request):
             user__password__isnull=False
         ).exclude(user__password='')
         
-        if not eligible_participants.exists():
+        # Seleccionar ganador aleatorio sin cargar el conjunto elegible en memoria
+        winner_participant, total_participants = _pick_random_participant(eligible_participants)
+        
+        if winner_participant is None:
             return Response({
                 'success': False,
                 'message': 'No hay participantes elegibles para el sorteo'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Seleccionar ganador aleatorio
-        winner_participant = random.choice(list(eligible_participants))
         winner_user = winner_participant.user
         
         # Actualizar el concurso con el ganador
         contest.winner = winner_user
-        contest.save()
+        contest.save(update_fields=['winner'])
         
         # Enviar email de notificación al ganador
+        # (si el broker no responde, queda en el outbox sin bloquear la request)
         try:
-            from .tasks import send_winner_notification_email
-            send_winner_notification_email.delay(winner_user.id, contest.id)
+            publish_or_spool(send_winner_notification_email, EmailOutbox.KIND_WINNER, winner_payload(winner_user, contest))
         except Exception as email_error:
-            # Si falla el envío asíncrono, intentar síncrono
-            try:
-                send_winner_notification_email(winner_user.id, contest.id)
-            except Exception as sync_error:
-                # Log error but don't fail the winner selection
-                print(f"Error enviando email de ganador: {sync_error}")
+            # Log error but don't fail the winner selection
+            logger.warning(f"Error enviando email de ganador: {email_error}", exc_info=True)
         
         # Preparar respuesta con información del ganador
         winner_data = {
@@ -598,9 +674,6 @@ def admin_select_winner(request):
             'contest_name': contest.name
         }
         
-        # Estadísticas del sorteo
-        total_participants = eligible_participants.count()
-        
         return Response({
             'success': True,
             'message': '¡Ganador seleccionado exitosamente!',
@@ -622,15 +695,325 @@ def admin_select_winner(request):
             'message': f'Error al seleccionar ganador: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def _get_verification_status(user, participant):
+def _draw_already_done_response(draw):
+    return Response({
+        'success': False,
+        'message': 'Ya se realizó un sorteo para este concurso. Para repetirlo envía redraw=true con un motivo (reason)',
+        'draw': {
+            'id': draw.id,
+            'created_at': draw.created_at.isoformat()
+        }
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+@csrf_exempt
+@api_view(['POST'])
+@authentication_classes([JWTAdminAuthentication])
+@permission_classes([IsAdminJWTUser])
+def admin_draw_winners(request):
+    """
+    Endpoint protegido para sortear K ganadores y M suplentes ordenados.
+    Recorre los ids elegibles en una sola pasada (muestreo por reservorio),
+    opcionalmente ponderado por `entries`, y guarda el resultado en DrawResult.
+    Si el concurso ya tiene un sorteo, repetirlo exige redraw=true y un motivo.
+    """
+    admin_user = request.user
+    
+    serializer = ContestDrawSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'message': 'Error en los datos proporcionados',
+            'field_errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    winners_count = serializer.validated_data['winners']
+    alternates_count = serializer.validated_data['alternates']
+    weighted = serializer.validated_data['weighted']
+    redraw = serializer.validated_data['redraw']
+    redraw_reason = serializer.validated_data.get('reason', '').strip() if redraw else ''
+    
+    try:
+        contest = Contest.objects.filter(is_active=True).first()
+        if not contest:
+            return Response({
+                'success': False,
+                'message': 'No hay concursos activos disponibles'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Como en admin_select_winner: no se repite un sorteo salvo petición
+        # explícita (redraw) con un motivo que queda registrado
+        previous_draw = contest.draws.order_by('-created_at').first()
+        if previous_draw and not redraw:
+            return _draw_already_done_response(previous_draw)
+        
+        eligible_participants = Participant.objects.filter(
+            contest=contest,
+            is_eligible=True,
+            user__is_email_verified=True,
+            user__password__isnull=False
+        ).exclude(user__password='')
+        
+        # Una sola pasada en streaming sobre (id, entries); memoria O(K + M)
+        total_eligible = 0
+        
+        def eligible_ids():
+            nonlocal total_eligible
+            for row in eligible_participants.values_list('id', 'entries').iterator(chunk_size=2000):
+                total_eligible += 1
+                yield row
+        
+        ranked_ids = reservoir_sample(eligible_ids(), winners_count + alternates_count, weighted=weighted)
+        
+        if not ranked_ids:
+            return Response({
+                'success': False,
+                'message': 'No hay participantes elegibles para el sorteo'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        winner_ids = ranked_ids[:winners_count]
+        alternate_ids = ranked_ids[winners_count:]
+        
+        with transaction.atomic():
+            # Bloquea el concurso y vuelve a comprobar: dos POST simultáneos no sortean dos veces
+            Contest.objects.select_for_update().filter(id=contest.id).first()
+            latest_draw = contest.draws.order_by('-created_at').first()
+            if latest_draw and (not redraw or latest_draw != previous_draw):
+                return _draw_already_done_response(latest_draw)
+            
+            draw = ContestDraw.objects.create(
+                contest=contest,
+                winners_count=winners_count,
+                alternates_count=alternates_count,
+                weighted=weighted,
+                total_eligible=total_eligible,
+                redraw_reason=redraw_reason,
+                created_by=admin_user
+            )
+            DrawResult.objects.bulk_create(
+                [DrawResult(draw=draw, participant_id=pid, role=DrawResult.ROLE_WINNER, position=i)
+                 for i, pid in enumerate(winner_ids, start=1)] +
+                [DrawResult(draw=draw, participant_id=pid, role=DrawResult.ROLE_ALTERNATE, position=i)
+                 for i, pid in enumerate(alternate_ids, start=1)]
+            )
+        
+        # Datos de los K + M seleccionados en una sola consulta. Un participante
+        # borrado tras el commit del sorteo se omite en la respuesta y en los emails
+        selected = Participant.objects.select_related('user').in_bulk(ranked_ids)
+        
+        def participant_data(pid, position):
+            participant = selected[pid]
+            return {
+                'position': position,
+                'participant_id': participant.id,
+                'id': participant.user.id,
+                'name': f"{participant.user.first_name} {participant.user.last_name}",
+                'email': participant.user.email,
+                'phone': participant.user.phone or 'No especificado',
+                'entries': participant.entries
+            }
+        
+        # Notificar solo a los ganadores (los suplentes quedan en reserva)
+        for pid in winner_ids:
+            if pid not in selected:
+                continue
+            try:
+                publish_or_spool(send_winner_notification_email, EmailOutbox.KIND_WINNER, winner_payload(selected[pid].user, contest))
+            except Exception as email_error:
+                logger.warning(f"Error enviando email de ganador: {email_error}", exc_info=True)
+        
+        return Response({
+            'success': True,
+            'message': '¡Sorteo realizado exitosamente!',
+            'draw': {
+                'id': draw.id,
+                'weighted': weighted,
+                'redraw_reason': draw.redraw_reason,
+                'created_at': draw.created_at.isoformat()
+            },
+            'winners': [participant_data(pid, i) for i, pid in enumerate(winner_ids, start=1) if pid in selected],
+            'alternates': [participant_data(pid, i) for i, pid in enumerate(alternate_ids, start=1) if pid in selected],
+            'contest': {
+                'id': contest.id,
+                'name': contest.name,
+                'total_eligible': total_eligible
+            },
+            'selected_by': {
+                'admin_email': admin_user.email,
+                'admin_name': f"{admin_user.first_name} {admin_user.last_name}"
+            }
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': f'Error al realizar el sorteo: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@require_http_methods(['GET'])
+def admin_participants_export(request):
+    """
+    Exportación completa de participantes en CSV o NDJSON (?format=csv|ndjson).
+    La respuesta se genera en streaming con QuerySet.iterator(), por lo que la
+    memoria es constante y el primer byte sale de inmediato.
+    El resultado de autenticación se comparte con JWTAuthenticationMiddleware.
+    """
+    try:
+        user, payload = authenticate_jwt_request(request)
+    except JWTAuthError as e:
+        return JsonResponse(e.as_dict(), status=e.status_code)
+    
+    if not is_admin_user(user):
+        return JsonResponse(IsAdminJWTUser.message, status=status.HTTP_403_FORBIDDEN)
+    
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return JsonResponse({
+            'success': False,
+            'message': 'Formato no soportado. Use csv o ndjson'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    rows = _participants_projection().iterator(chunk_size=settings.ADMIN_EXPORT_CHUNK_SIZE)
+    participants = (_serialize_participant_row(row) for row in rows)
+    
+    if export_format == 'csv':
+        writer = csv.writer(_EchoBuffer())
+        header = [writer.writerow(PARTICIPANT_EXPORT_FIELDS)]
+        body = (writer.writerow([_csv_safe(p[field]) for field in PARTICIPANT_EXPORT_FIELDS]) for p in participants)
+        response = StreamingHttpResponse(chain(header, body), content_type='text/csv; charset=utf-8')
+    else:
+        body = (json.dumps(p, ensure_ascii=False) + '\n' for p in participants)
+        response = StreamingHttpResponse(body, content_type='application/x-ndjson; charset=utf-8')
+    
+    filename = f"participantes-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+PARTICIPANT_EXPORT_FIELDS = [
+    'id', 'name', 'email', 'phone', 'is_eligible', 'is_email_verified',
+    'has_password', 'registration_date', 'verification_status',
+]
+
+# Prefijos que una hoja de cálculo interpreta como fórmula (CSV/formula injection)
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def _csv_safe(value):
+    """Antepone ' a los textos que empiezan como una fórmula para que se muestren literalmente"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+class _EchoBuffer:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de almacenarla"""
+    def write(self, value):
+        return value
+
+def _participants_projection():
+    """
+    Participantes con los campos del usuario proyectados vía JOIN (values()),
+    ordenados del más reciente al más antiguo.
+    """
+    return Participant.objects.annotate(
+        has_password=ExpressionWrapper(~Q(user__password=''), output_field=BooleanField())
+    ).order_by('-registered_at', '-id').values(
+        'id', 'registered_at', 'is_eligible', 'has_password',
+        'user__first_name', 'user__last_name', 'user__email',
+        'user__phone', 'user__is_email_verified',
+    )
+
+def _serialize_participant_row(row):
+    """Convierte una fila de _participants_projection() al formato de la API"""
+    return {
+        'id': row['id'],
+        'name': f"{row['user__first_name']} {row['user__last_name']}".strip() or 'Sin nombre',
+        'email': row['user__email'],
+        'phone': row['user__phone'] or 'No especificado',
+        'is_eligible': row['is_eligible'],
+        'is_email_verified': row['user__is_email_verified'],
+        'has_password': row['has_password'],  # Indica si completó el registro
+        'registration_date': row['registered_at'].isoformat(),
+        'verification_status': _get_verification_status(
+            row['user__is_email_verified'], row['has_password'], row['is_eligible']
+        )
+    }
+
+def _get_verification_status(is_email_verified, has_password, is_eligible):
     """
     Función auxiliar para determinar el estado de verificación del participante
     """
-    if not user.is_email_verified:
+    if not is_email_verified:
         return 'Email pendiente'
-    elif not user.password:
+    elif not has_password:
         return 'Contraseña pendiente'
-    elif not participant.is_eligible:
+    elif not is_eligible:
         return 'No elegible'
     else:
-        return 'Completamente verificado'
\ No newline at end of file
+        return 'Completamente verificado'
+
+def _get_participant_stats(queryset):
+    """
+    Calcula todos los contadores de participantes (incluidos los estados de
+    _get_verification_status) en una sola consulta con Count condicional.
+    """
+    has_password = ~Q(user__password='')
+    counts = queryset.aggregate(
+        total_count=Count('id'),
+        verified_count=Count('id', filter=Q(user__is_email_verified=True)),
+        password_count=Count('id', filter=has_password),
+        eligible_count=Count('id', filter=Q(is_eligible=True)),
+        email_pending=Count('id', filter=Q(user__is_email_verified=False)),
+        password_pending=Count('id', filter=Q(user__is_email_verified=True, user__password='')),
+        not_eligible=Count('id', filter=Q(user__is_email_verified=True, is_eligible=False) & has_password),
+        fully_verified=Count('id', filter=Q(user__is_email_verified=True, is_eligible=True) & has_password),
+    )
+    return {
+        'total_count': counts['total_count'],
+        'verified_count': counts['verified_count'],
+        'password_count': counts['password_count'],
+        'eligible_count': counts['eligible_count'],
+        'verification_status': {
+            'Email pendiente': counts['email_pending'],
+            'Contraseña pendiente': counts['password_pending'],
+            'No elegible': counts['not_eligible'],
+            'Completamente verificado': counts['fully_verified'],
+        }
+    }
+
+def _pick_random_participant(queryset, attempts=3):
+    """
+    Elige un participante uniformemente al azar con un count() y una sola
+    consulta LIMIT 1 OFFSET n, sin materializar el conjunto elegible.
+    Devuelve (participante, total) o (None, 0) si no hay candidatos.
+    """
+    ordered = queryset.select_related('user').order_by('id')
+    for _ in range(attempts):
+        total = queryset.count()
+        if total == 0:
+            return None, 0
+        offset = random.SystemRandom().randrange(total)
+        # El conjunto pudo cambiar entre count() y el OFFSET; en ese caso se reintenta
+        picked = ordered[offset:offset + 1].first()
+        if picked is not None:
+            return picked, total
+    return None, 0
+
+def _encode_participants_cursor(registered_at, participant_id):
+    """
+    Codifica la posición (registered_at, id) del último participante de la página
+    """
+    raw = f"{registered_at.isoformat()}|{participant_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_participants_cursor(cursor):
+    """
+    Decodifica un cursor de paginación. Lanza ValueError si está malformado.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_part, id_part = raw.rsplit('|', 1)
+        registered_at = datetime.fromisoformat(date_part)
+        participant_id = int(id_part)
+    except (ValueError, UnicodeError, binascii.Error) as e:
+        raise ValueError('Cursor inválido') from e
+    if timezone.is_naive(registered_at):
+        raise ValueError('Cursor inválido')
+    return registered_at, participant_id